@@ -2,27 +2,92 @@ from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
+import asyncio
+import http.cookiejar
+import multiprocessing
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
 
 # Handle both package and direct imports
 try:
     from ..database import engine
     from ..models import Submission, Essay, Grading
-    from ..utils.pdf_extractor import pdf_to_text
+    from ..utils.pdf_extractor import pdf_to_text_str
     from ..jwtvalidate import Bearer
+    from ..utils.cache import TTLCache
 except ImportError:
     from app.database import engine
     from app.models import Submission, Essay, Grading
-    from app.utils.pdf_extractor import pdf_to_text
+    from app.utils.pdf_extractor import pdf_to_text_str
     from app.jwtvalidate import Bearer
+    from app.utils.cache import TTLCache
 
 try:
     from canvasapi import Canvas
+    from canvasapi.submission import Submission as CanvasSubmission
 except Exception:
     Canvas = None
+    CanvasSubmission = None
+
+# Downloads are copied in 1 MiB chunks through a 1 MiB file buffer, so a large
+# PDF turns into a handful of write syscalls rather than thousands.
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+# Shared by every ingest so the total number of in-flight Canvas downloads stays bounded.
+_DOWNLOAD_POOL = ThreadPoolExecutor(
+    max_workers=int(os.getenv("CANVAS_DL_CONCURRENCY", "8")),
+    thread_name_prefix="canvas-download",
+)
+
+# Ingest commits in checkpoints of this many submissions, so a failure late in a
+# large class only loses the current batch.
+INGEST_COMMIT_EVERY = 50
+
+# PDF text extraction is CPU-bound, so it runs in worker processes (spawned, not
+# forked, since the server process is multi-threaded).
+_PDF_POOL = ProcessPoolExecutor(
+    max_workers=int(os.getenv("PDF_WORKERS", "4")),
+    mp_context=multiprocessing.get_context("spawn"),
+)
+
+# Upper bound on how long one ingest waits for its PDFs to be extracted.
+PDF_EXTRACT_TIMEOUT = float(os.getenv("PDF_EXTRACT_TIMEOUT", "120"))
+
+
+# One pooled, keep-alive HTTP session for every Canvas call and attachment
+# download, so repeat requests to a Canvas host reuse its TLS connection across
+# service instances. Tokens are sent per request, never stored on the session,
+# and cookies are refused so nothing set for one user rides along for another.
+_HTTP_SESSION = requests.Session()
+_HTTP_ADAPTER = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+)
+_HTTP_SESSION.mount("https://", _HTTP_ADAPTER)
+_HTTP_SESSION.mount("http://", _HTTP_ADAPTER)
+_HTTP_SESSION.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+
+
+def shutdown_executors():
+    """Stop the shared download and PDF extraction pools and close pooled connections (called on app shutdown)."""
+    _DOWNLOAD_POOL.shutdown(wait=False, cancel_futures=True)
+    # Reap the worker processes before interpreter teardown; leaving them to
+    # the pool's management thread can hang exit
+    _PDF_POOL.shutdown(wait=True, cancel_futures=True)
+    _HTTP_SESSION.close()
+
+# Course/assignment metadata rarely changes between a teacher's ingest and
+# grade-post clicks, so lookups are memoized briefly. Keys include the token
+# because cached objects keep the requester they were fetched with.
+_COURSE_CACHE = TTLCache(maxsize=512, ttl=300)
+_ASSIGNMENT_CACHE = TTLCache(maxsize=2048, ttl=300)
 
 
 class CanvasIngestRequest(BaseModel):
@@ -42,22 +107,50 @@ class CanvasClientService:
         if Canvas is None:
             raise RuntimeError("canvasapi package not installed. pip install canvasapi")
         self.canvas = Canvas(base_url, api_token)
+        # canvasapi opens a fresh requests.Session per Canvas object; point its
+        # requester at the shared pool instead (it adds the token per request)
+        requester = getattr(self.canvas, "_Canvas__requester", None)
+        if requester is not None:
+            requester._session = _HTTP_SESSION
+        self.base_url = base_url
         self.api_token = api_token
+        self.session = _HTTP_SESSION
+        self._auth_headers = {"Authorization": f"Bearer {api_token}"}
 
     def get_courses(self, **kwargs):
         """Return an iterable of courses (pass-through to canvas.get_courses)."""
         return self.canvas.get_courses(**kwargs)
 
     def get_course(self, course_id: int):
-        return self.canvas.get_course(course_id)
+        key = (self.base_url, self.api_token, course_id)
+        course = _COURSE_CACHE.get(key)
+        if course is None:
+            course = self.canvas.get_course(course_id)
+            _COURSE_CACHE.set(key, course)
+        return course
 
     def get_assignment(self, course, assignment_id: int):
-        return course.get_assignment(assignment_id)
-
-    def get_submissions(self, assignment, student_id: Optional[int] = None):
+        key = (self.base_url, self.api_token, course.id, assignment_id)
+        assignment = _ASSIGNMENT_CACHE.get(key)
+        if assignment is None:
+            assignment = course.get_assignment(assignment_id)
+            _ASSIGNMENT_CACHE.set(key, assignment)
+        return assignment
+
+    def invalidate(self, course_id: Optional[int], assignment_id: Optional[int] = None):
+        """Drop cached course/assignment lookups, e.g. after Canvas rejected them."""
+        _COURSE_CACHE.pop((self.base_url, self.api_token, course_id))
+        if assignment_id is not None:
+            _ASSIGNMENT_CACHE.pop((self.base_url, self.api_token, course_id, assignment_id))
+
+    def get_submissions(self, assignment, student_id: Optional[int] = None, **kwargs):
+        # Side-load the user so names need no extra request per student (attachments
+        # are part of the submission JSON already), and page at Canvas's maximum.
+        kwargs.setdefault("include", ["user"])
         if student_id:
-            return [assignment.get_submission(student_id)]
-        return assignment.get_submissions()
+            return [assignment.get_submission(student_id, **kwargs)]
+        kwargs.setdefault("per_page", 100)
+        return assignment.get_submissions(**kwargs)
 
     def download_fileobj(self, file_obj, target_path: Path):
         # Canvas File object may provide download(path)
@@ -68,12 +161,30 @@ class CanvasClientService:
         url = getattr(file_obj, "url", None) or getattr(file_obj, "html_url", None) or (getattr(file_obj, "_json", {}).get("url") if hasattr(file_obj, "_json") else None)
         return self._http_download(url, target_path)
 
+    def _needs_download(self, url: str, target_path: Path) -> bool:
+        """
+        Return False when target_path already holds a file of the size Canvas reports.
+
+        Uses a HEAD on the pooled session; any failure or missing Content-Length
+        means the file is downloaded again.
+        """
+        if not target_path.exists():
+            return True
+        try:
+            resp = self.session.head(url, headers=self._auth_headers, timeout=10, allow_redirects=True)
+            expected = int(resp.headers.get("Content-Length", -1))
+        except Exception:
+            return True
+        return expected != target_path.stat().st_size
+
     def _http_download(self, url: str, target_path: Path):
-        headers = {"Authorization": f"Bearer {self.api_token}"}
-        resp = requests.get(url, headers=headers, timeout=30)
-        resp.raise_for_status()
-        with open(target_path, "wb") as fh:
-            fh.write(resp.content)
+        # Stream in fixed-size chunks so memory stays flat regardless of file size;
+        # the with-block hands the connection back to the pool when done.
+        with self.session.get(url, headers=self._auth_headers, timeout=30, stream=True) as resp:
+            resp.raise_for_status()
+            with open(target_path, "wb", buffering=DOWNLOAD_CHUNK_SIZE) as fh:
+                for chunk in resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    fh.write(chunk)
         return str(target_path)
 
 
@@ -98,11 +209,141 @@ def _safe_get_attr(obj: Any, *attrs, default=None):
     return cur
 
 
+def _flatten(obj: Any) -> Dict[str, Any]:
+    """
+    Snapshot a Canvas object's fields into a plain dict.
+
+    Built once per object so later lookups are cheap dict.get calls instead of
+    repeated getattr/except probing. Dicts are returned as-is; None becomes {}.
+    """
+    if obj is None:
+        return {}
+    if isinstance(obj, dict):
+        return obj
+    flat = dict(getattr(obj, "_json", None) or {})
+    flat.update(getattr(obj, "__dict__", {}))
+    return flat
+
+
+# Where a submission's attachments may live, tried in order. The Canvas files
+# API is only called when none of these yields anything.
+_ATTACHMENT_PATHS = (
+    ("attachments",),
+    ("_raw", "attachments"),
+    ("_raw", "files"),
+    ("_raw", "submission_data", "attachments"),
+    ("submission", "attachments"),
+    ("submission", "files"),
+    ("submission", "submission_data", "attachments"),
+)
+
+
+def _attachment_dict(a: Any) -> Dict[str, Any]:
+    """Normalize an attachment (dict or Canvas object) to a dict with url/filename."""
+    if isinstance(a, dict):
+        return a
+    fa = _flatten(a)
+    return {
+        "url": fa.get("url") or fa.get("html_url"),
+        "filename": fa.get("filename") or fa.get("display_name")
+    }
+
+
+def _extract_attachments(sub: Any, flat: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Return the submission's attachments from the first source that has any."""
+    for path in _ATTACHMENT_PATHS:
+        found: Any = flat
+        for key in path:
+            found = found.get(key) if isinstance(found, dict) else None
+        if isinstance(found, list) and found:
+            return [_attachment_dict(a) for a in found]
+
+    try:
+        attachments = []
+        for f in sub.get_files(per_page=100):
+            ff = _flatten(f)
+            url = ff.get("url") or ff.get("html_url")
+            filename = ff.get("display_name") or ff.get("filename") or ff.get("name")
+            attachments.append({"url": url, "filename": filename, "file_obj": f})
+        return attachments
+    except Exception:
+        return []
+
+
+def _attachment_filename(a: Dict[str, Any]) -> str:
+    """Resolve the name an attachment is saved under from its metadata, file object or URL."""
+    filename = a.get("filename") or a.get("display_name") or a.get("name")
+    file_obj = a.get("file_obj")
+    if not filename and file_obj is not None:
+        filename = _safe_get_attr(file_obj, "display_name", default=None) or _safe_get_attr(file_obj, "filename", default=None)
+    if not filename:
+        url = a.get("url") or a.get("html_url") or a.get("download_url") or ""
+        filename = url.rsplit("/", 1)[-1].split("?", 1)[0]
+    return filename or "attachment"
+
+
+def _with_save_names(attachments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Give each attachment a distinct save_name within its submission.
+
+    Attachments are downloaded concurrently, so two with the same display name
+    must not share a path; repeats get a numeric suffix (essay.pdf, essay_2.pdf).
+    """
+    taken: set[str] = set()
+    named = []
+    for a in attachments:
+        name = _attachment_filename(a)
+        if name in taken:
+            stem, suffix = Path(name).stem, Path(name).suffix
+            n = 2
+            while f"{stem}_{n}{suffix}" in taken:
+                n += 1
+            name = f"{stem}_{n}{suffix}"
+        taken.add(name)
+        named.append({**a, "save_name": name})
+    return named
+
+
+def _download_attachment(service: CanvasClientService, target_dir: Path, a: Dict[str, Any]):
+    """
+    Download one attachment into target_dir under its save_name.
+
+    Returns the saved path, an error dict if the URL download failed, or None
+    when there was nothing to download.
+    """
+    url = a.get("url") or a.get("html_url") or a.get("download_url")
+    file_obj = a.get("file_obj")
+    save_path = target_dir / (a.get("save_name") or _attachment_filename(a))
+
+    if file_obj is not None:
+        try:
+            # Re-ingest: skip files already on disk with the size Canvas reports
+            size = getattr(file_obj, "size", None)
+            if size is not None and save_path.exists() and save_path.stat().st_size == size:
+                return str(save_path)
+            return service.download_fileobj(file_obj, save_path)
+        except Exception:
+            pass
+
+    if not url:
+        return None
+
+    try:
+        if not service._needs_download(url, save_path):
+            return str(save_path)
+        return service._http_download(url, save_path)
+    except Exception as e:
+        return {"error": str(e), "url": url}
+
+
 @router.post("/submissions/ingest")
-def ingest_submissions(req: CanvasIngestRequest, payload: dict = Depends(auth)):
+async def ingest_submissions(req: CanvasIngestRequest, payload: dict = Depends(auth)):
     """
     Ingest submissions for an assignment from Canvas, download attached files (PDFs),
     and create Submission DB records with saved file paths.
+
+    canvasapi and SQLite calls are blocking, so each phase runs in a worker thread
+    and the event loop is free while Canvas responds.
     """
     user_email = payload.get("email")
     
@@ -112,6 +353,31 @@ def ingest_submissions(req: CanvasIngestRequest, payload: dict = Depends(auth)):
         raise HTTPException(status_code=400, detail="Canvas API token not configured in environment and not provided in request")
     
     service = CanvasClientService(req.canvas_base_url, canvas_api_token)
+    pending = await run_in_threadpool(_discover_submissions, service, req)
+
+    # Download concurrently so Canvas round-trips overlap instead of adding up.
+    # The shared download pool caps in-flight Canvas requests across all ingests.
+    loop = asyncio.get_running_loop()
+    downloads = await asyncio.gather(*(
+        asyncio.gather(*(
+            loop.run_in_executor(_DOWNLOAD_POOL, _download_attachment, service, entry["target_dir"], a)
+            for a in entry["attachments"]
+        ))
+        for entry in pending
+    ))
+
+    results = await run_in_threadpool(_persist_submissions, req, pending, downloads, canvas_api_token, user_email)
+
+    return {"ingested": results}
+
+
+def _discover_submissions(service: CanvasClientService, req: CanvasIngestRequest) -> List[Dict[str, Any]]:
+    """
+    Fetch the assignment's submissions and collect the attachments to download.
+
+    Returns one entry per submission with its student info, target directory and
+    attachment dicts (empty when nothing was found).
+    """
     try:
         course = service.get_course(req.course_id)
         assignment = service.get_assignment(course, req.assignment_id)
@@ -124,82 +390,95 @@ def ingest_submissions(req: CanvasIngestRequest, payload: dict = Depends(auth)):
         raise HTTPException(status_code=400, detail=f"Failed to fetch submissions: {e}")
 
     base_storage = Path("data/submissions")
-    results: List[Dict[str, Any]] = []
-
+    created_dirs: set[str] = set()
+    pending: List[Dict[str, Any]] = []
     for sub in submissions_list:
-        student_id = _safe_get_attr(sub, "user_id", default=None) or _safe_get_attr(sub, "user", "id", default=None)
-        student_name = _safe_get_attr(sub, "user", "name", default=None) or _safe_get_attr(sub, "user_name", default=None)
-
-        attachments: List[Dict[str, Any]] = []
-        att = _safe_get_attr(sub, "attachments", default=None)
-        if att:
-            for a in att:
-                if isinstance(a, dict):
-                    attachments.append(a)
-                else:
-                    attachments.append({
-                        "url": _safe_get_attr(a, "url", default=None) or _safe_get_attr(a, "html_url", default=None),
-                        "filename": _safe_get_attr(a, "filename", default=None) or _safe_get_attr(a, "display_name", default=None)
-                    })
+        flat = _flatten(sub)
+        user = _flatten(flat.get("user"))
+        student_id = flat.get("user_id") or user.get("id")
+        student_name = user.get("name") or flat.get("user_name")
 
-        if not attachments:
-            try:
-                files = sub.get_files()
-                for f in files:
-                    url = _safe_get_attr(f, "url", default=None) or _safe_get_attr(f, "html_url", default=None) or (getattr(f, "_json", {}).get("url") if hasattr(f, "_json") else None)
-                    filename = _safe_get_attr(f, "display_name", default=None) or _safe_get_attr(f, "filename", default=None) or _safe_get_attr(f, "name", default=None)
-                    attachments.append({"url": url, "filename": filename, "file_obj": f})
-            except Exception:
-                pass
+        attachments = _with_save_names(_extract_attachments(sub, flat))
 
         if not attachments:
-            raw = _safe_get_attr(sub, "_raw", default=None) or _safe_get_attr(sub, "submission", default=None)
-            if isinstance(raw, dict):
-                maybe = raw.get("attachments") or raw.get("files") or (raw.get("submission_data", {}) or {}).get("attachments")
-                if isinstance(maybe, list):
-                    for a in maybe:
-                        if isinstance(a, dict):
-                            attachments.append(a)
-
-        saved_files: List[Any] = []
-        if not attachments:
-            results.append({"student_id": student_id, "student_name": student_name, "files": []})
+            pending.append({"student_id": student_id, "student_name": student_name, "attachments": []})
             continue
 
         target_dir = base_storage / str(req.assignment_id) / (str(student_id) if student_id else "unknown_student")
-        os.makedirs(target_dir, exist_ok=True)
+        key = str(target_dir)
+        if key not in created_dirs:
+            target_dir.mkdir(parents=True, exist_ok=True)
+            created_dirs.add(key)
+        pending.append({"student_id": student_id, "student_name": student_name, "target_dir": target_dir, "attachments": attachments})
 
-        for a in attachments:
-            url = a.get("url") or a.get("html_url") or a.get("download_url")
-            filename = a.get("filename") or a.get("display_name") or a.get("name")
-            file_obj = a.get("file_obj")
+    return pending
 
-            if not filename and file_obj is not None:
-                filename = _safe_get_attr(file_obj, "display_name", default=None) or _safe_get_attr(file_obj, "filename", default=None)
 
-            if file_obj is not None:
+def _collect_texts(downloads: List[List[Any]]) -> Dict[str, str]:
+    """
+    Extract the text of every downloaded PDF/.txt file, keyed by saved path.
+
+    PDFs are extracted in parallel on the PDF pool, bounded by PDF_EXTRACT_TIMEOUT
+    for the whole ingest; files that fail or run out of time are skipped.
+    """
+    pdf_jobs = {}
+    texts: Dict[str, str] = {}
+    for entry_downloads in downloads:
+        for saved in entry_downloads:
+            if not isinstance(saved, str) or not Path(saved).exists():
+                continue
+            suffix = Path(saved).suffix.lower()
+            if suffix == '.pdf':
+                pdf_jobs[saved] = _PDF_POOL.submit(pdf_to_text_str, saved)
+            elif suffix == '.txt':
+                # Read text file directly
                 try:
-                    save_path = Path(target_dir) / (filename or "downloaded_file")
-                    saved = service.download_fileobj(file_obj, save_path)
-                    saved_files.append(saved)
-                    continue
-                except Exception:
-                    pass
+                    with open(saved, 'r', encoding='utf-8') as f:
+                        texts[saved] = f.read()
+                except Exception as e:
+                    print(f"Failed to read text file {saved}: {e}")
+
+    done, _ = wait(pdf_jobs.values(), timeout=PDF_EXTRACT_TIMEOUT)
+    for file_path, job in pdf_jobs.items():
+        if job not in done:
+            job.cancel()
+            print(f"Failed to extract text from PDF {file_path}: timed out after {PDF_EXTRACT_TIMEOUT}s")
+            continue
+        try:
+            text_content = job.result()
+            # Keep the .txt sidecar next to the PDF, without re-reading it
+            Path(file_path).with_suffix('.txt').write_text(text_content, encoding='utf-8')
+        except Exception as e:
+            # Log error but continue processing
+            print(f"Failed to extract text from PDF {file_path}: {e}")
+            continue
+        texts[file_path] = text_content
+    return texts
+
 
-            if not url:
+def _persist_submissions(req: CanvasIngestRequest, pending: List[Dict[str, Any]], downloads: List[List[Any]], canvas_api_token: str, user_email: Optional[str]) -> List[Dict[str, Any]]:
+    """Create Submission and Essay records for the downloaded attachments."""
+    # All extraction happens before the session opens: the first flush starts a
+    # SQLite write transaction, and waiting on PDFs inside it would lock out
+    # every other writer (signups, uploads, /grade) for the duration.
+    texts = _collect_texts(downloads)
+
+    results: List[Dict[str, Any]] = []
+    # One session for the whole ingest: rows are flushed per submission (to get
+    # ids) and committed in checkpoints rather than once per submission.
+    with Session(engine) as session:
+        uncommitted = 0
+        for entry, entry_downloads in zip(pending, downloads):
+            student_id = entry["student_id"]
+            student_name = entry["student_name"]
+            if not entry["attachments"]:
+                results.append({"student_id": student_id, "student_name": student_name, "files": []})
                 continue
 
-            try:
-                save_path = Path(target_dir) / (filename or Path(url).name or "attachment")
-                saved = service._http_download(url, save_path)
-                saved_files.append(saved)
-            except Exception as e:
-                saved_files.append({"error": str(e), "url": url})
+            saved_files: List[Any] = [d for d in entry_downloads if d is not None]
 
-        # Extract text from downloaded files and create Essay records
-        file_paths_str = ",".join([f for f in saved_files if isinstance(f, str)])
-        with Session(engine) as session:
             # Create Submission record (persist Canvas context so we can post grades later)
+            file_paths_str = ",".join([f for f in saved_files if isinstance(f, str)])
             record = Submission(
                 course_id=req.course_id,
                 assignment_id=req.assignment_id,
@@ -211,73 +490,86 @@ def ingest_submissions(req: CanvasIngestRequest, payload: dict = Depends(auth)):
                 canvas_api_token=canvas_api_token
             )
             session.add(record)
-            session.commit()
-            session.refresh(record)
+            session.flush()
+            record_id = record.id
 
-            # Process files and create Essay records
-            essay_ids = []
+            # Create Essay records from the text extracted above
+            pending_essays: List[Essay] = []
             for file_path in saved_files:
                 if not isinstance(file_path, str):
                     continue
-
-                file_path_obj = Path(file_path)
-                if not file_path_obj.exists():
-                    continue
-
-                # Extract text based on file type
-                text_content = None
-                filename = file_path_obj.name
-
-                if file_path_obj.suffix.lower() == '.pdf':
-                    # Extract text from PDF
-                    try:
-                        text_path = file_path_obj.with_suffix('.txt')
-                        pdf_to_text(str(file_path_obj), str(text_path))
-                        with open(text_path, 'r', encoding='utf-8') as f:
-                            text_content = f.read()
-                    except Exception as e:
-                        # Log error but continue processing
-                        print(f"Failed to extract text from PDF {file_path}: {e}")
-                        continue
-
-                elif file_path_obj.suffix.lower() == '.txt':
-                    # Read text file directly
-                    try:
-                        with open(file_path_obj, 'r', encoding='utf-8') as f:
-                            text_content = f.read()
-                    except Exception as e:
-                        print(f"Failed to read text file {file_path}: {e}")
-                        continue
-                else:
-                    # Skip unsupported file types
-                    continue
+                text_content = texts.get(file_path)
+                filename = Path(file_path).name
 
                 if text_content:
                     # Create Essay record and link back to Submission
                     essay = Essay(
                         filename=f"{student_name or student_id}_{filename}",
                         content=text_content,
-                        submission_id=record.id,
+                        submission_id=record_id,
                         created_by=user_email
                     )
-                    session.add(essay)
-                    session.commit()
-                    session.refresh(essay)
-                    essay_ids.append(essay.id)
+                    pending_essays.append(essay)
+
+            # One INSERT batch for all of this submission's essays; flush assigns ids
+            session.add_all(pending_essays)
+            session.flush()
+            essay_ids = [e.id for e in pending_essays]
 
             results.append({
-                "submission_db_id": record.id,
+                "submission_db_id": record_id,
                 "student_id": student_id,
                 "student_name": student_name,
                 "files": saved_files,
                 "essay_ids": essay_ids
             })
 
-    return {"ingested": results}
+            uncommitted += 1
+            if uncommitted >= INGEST_COMMIT_EVERY:
+                session.commit()
+                uncommitted = 0
+
+        session.commit()
+
+    return results
 
 # ---------------------------------------------------------------------------
 # POST grade back to Canvas
 # ---------------------------------------------------------------------------
+def scale_to_points(total_score: float, assignment) -> float:
+    """Scale a 0-10 grading score to the assignment's points_possible (defaults to 10)."""
+    points_possible = getattr(assignment, "points_possible", None) or getattr(assignment, "points", None) or 10.0
+    try:
+        return float(total_score) / 10.0 * float(points_possible)
+    except Exception:
+        return float(total_score)
+
+
+def post_points(assignment, student_id: int, final_points: float):
+    """Set the posted grade on one student's Canvas submission."""
+    # The grade PUT is addressed purely by ids, so build the submission locally
+    # rather than spending a GET on assignment.get_submission first
+    canvas_submission = CanvasSubmission(assignment._requester, {
+        "course_id": assignment.course_id,
+        "assignment_id": assignment.id,
+        "user_id": student_id,
+    })
+    canvas_submission.edit(submission={'posted_grade': final_points})
+
+
+def canvas_context(submission: Submission):
+    """
+    Resolve (canvas_base_url, canvas_api_token, course_id) for a stored Submission.
+
+    Prefers values saved during ingest, falling back to the CANVAS_BASE_URL,
+    CANVAS_API_TOKEN and CANVAS_COURSE_ID environment variables.
+    """
+    canvas_base_url = getattr(submission, "canvas_base_url", None) or os.getenv("CANVAS_BASE_URL")
+    canvas_api_token = getattr(submission, "canvas_api_token", None) or os.getenv("CANVAS_API_TOKEN")
+    course_id = getattr(submission, "course_id", None) or (int(os.getenv("CANVAS_COURSE_ID")) if os.getenv("CANVAS_COURSE_ID") else None)
+    return canvas_base_url, canvas_api_token, course_id
+
+
 class PostGradeRequest(BaseModel):
     canvas_base_url: str
     api_token: str
@@ -314,19 +606,14 @@ def post_grade_to_canvas(req: PostGradeRequest):
     if total_score is None:
         raise HTTPException(status_code=400, detail="Grading has no total_score")
 
-    # Get assignment points possible; fall back to 10
-    points_possible = getattr(assignment, "points_possible", None) or getattr(assignment, "points", None) or 10.0
-
     # Scale 0-10 to assignment points
-    try:
-        final_points = float(total_score) / 10.0 * float(points_possible)
-    except Exception:
-        final_points = float(total_score)
+    final_points = scale_to_points(total_score, assignment)
 
     try:
-        submission = assignment.get_submission(req.student_id)
-        submission.edit(submission={'posted_grade': final_points})
+        post_points(assignment, req.student_id, final_points)
     except Exception as e:
+        # The cached course/assignment may be stale (deleted or token revoked)
+        service.invalidate(req.course_id, req.assignment_id)
         raise HTTPException(status_code=400, detail=f"Failed to post grade to Canvas: {e}")
 
     return {"ok": True, "posted_grade": final_points}
@@ -371,16 +658,12 @@ def post_grade_from_grading(req: PostGradeFromGradingRequest):
         if total_score is None:
             raise HTTPException(status_code=400, detail="Grading has no total_score")
 
-        # Prefer submission-stored Canvas credentials, fall back to environment
-        canvas_base_url = getattr(submission, "canvas_base_url", None) or os.getenv("CANVAS_BASE_URL")
-        canvas_api_token = getattr(submission, "canvas_api_token", None) or os.getenv("CANVAS_API_TOKEN")
+        # Prefer submission-stored Canvas credentials and course, fall back to environment
+        canvas_base_url, canvas_api_token, course_id = canvas_context(submission)
 
         if not canvas_base_url or not canvas_api_token:
             raise HTTPException(status_code=400, detail="No Canvas connection info available (submission or env)")
 
-        # Prefer submission.course_id, fall back to env CANVAS_COURSE_ID if set.
-        course_id = getattr(submission, "course_id", None) or (int(os.getenv("CANVAS_COURSE_ID")) if os.getenv("CANVAS_COURSE_ID") else None)
-
         # Use assignment_id and student_id from submission where possible
         assignment_id = getattr(submission, "assignment_id", None)
         student_id = getattr(submission, "student_id", None)
@@ -389,6 +672,7 @@ def post_grade_from_grading(req: PostGradeFromGradingRequest):
             raise HTTPException(status_code=400, detail="Submission missing assignment_id or student_id")
 
         # Use Canvas client and post
+        service = None
         try:
             service = CanvasClientService(canvas_base_url, canvas_api_token)
 
@@ -400,18 +684,100 @@ def post_grade_from_grading(req: PostGradeFromGradingRequest):
             course = service.get_course(course_id)
             assignment = service.get_assignment(course, assignment_id)
 
-            # Determine points possible and compute final points
-            points_possible = getattr(assignment, "points_possible", None) or getattr(assignment, "points", None) or 10.0
-            try:
-                final_points = float(total_score) / 10.0 * float(points_possible)
-            except Exception:
-                final_points = float(total_score)
-
-            canvas_submission = assignment.get_submission(student_id)
-            canvas_submission.edit(submission={'posted_grade': final_points})
+            final_points = scale_to_points(total_score, assignment)
+            post_points(assignment, student_id, final_points)
         except HTTPException:
             raise
         except Exception as e:
+            if service is not None:
+                service.invalidate(course_id, assignment_id)
             raise HTTPException(status_code=400, detail=f"Failed to post grade to Canvas: {e}")
 
-    return {"ok": True, "posted_grade": final_points}
\ No newline at end of file
+    return {"ok": True, "posted_grade": final_points}
+
+
+# ---------------------------------------------------------------------------
+# POST many grades to Canvas at once
+# ---------------------------------------------------------------------------
+class PostGradesBulkRequest(BaseModel):
+    grading_ids: List[int]
+
+
+def _resolve_bulk_targets(grading_ids: List[int], user_email: Optional[str]):
+    """
+    Load gradings and group them by Canvas (base_url, token, course_id, assignment_id).
+
+    Returns (groups, results): groups maps each Canvas assignment to a list of
+    (grading_id, student_id, total_score); results holds errors for gradings
+    that cannot be posted, including ones user_email did not create.
+    """
+    groups: Dict[tuple, List[tuple]] = {}
+    results: Dict[int, Dict[str, Any]] = {}
+    with Session(engine) as session:
+        for grading_id in grading_ids:
+            grading = session.get(Grading, grading_id)
+            if not grading:
+                results[grading_id] = {"grading_id": grading_id, "ok": False, "error": "Grading not found"}
+                continue
+            if grading.created_by != user_email:
+                results[grading_id] = {"grading_id": grading_id, "ok": False, "error": "Access denied to grading"}
+                continue
+            if grading.total_score is None:
+                results[grading_id] = {"grading_id": grading_id, "ok": False, "error": "Grading has no total_score"}
+                continue
+
+            essay = session.get(Essay, grading.essay_id) if grading.essay_id else None
+            submission = session.get(Submission, essay.submission_id) if essay and essay.submission_id else None
+            if not submission:
+                results[grading_id] = {"grading_id": grading_id, "ok": False, "error": "No linked Submission found for this grading"}
+                continue
+
+            canvas_base_url, canvas_api_token, course_id = canvas_context(submission)
+            if not canvas_base_url or not canvas_api_token:
+                results[grading_id] = {"grading_id": grading_id, "ok": False, "error": "No Canvas connection info available (submission or env)"}
+                continue
+            if not course_id or not submission.assignment_id or not submission.student_id:
+                results[grading_id] = {"grading_id": grading_id, "ok": False, "error": "Submission missing course_id, assignment_id or student_id"}
+                continue
+
+            key = (canvas_base_url, canvas_api_token, course_id, submission.assignment_id)
+            groups.setdefault(key, []).append((grading_id, submission.student_id, grading.total_score))
+    return groups, results
+
+
+@router.post("/post_grades/bulk")
+async def post_grades_bulk(req: PostGradesBulkRequest, payload: dict = Depends(auth)):
+    """
+    Post many gradings back to Canvas using their stored Submission context.
+
+    Gradings are grouped by Canvas assignment so each course/assignment is looked
+    up once per group; the per-student posts then run concurrently (at most 8 in
+    flight). Returns one result per requested grading_id, in request order.
+    """
+    groups, results = await run_in_threadpool(_resolve_bulk_targets, req.grading_ids, payload.get("email"))
+    sem = asyncio.Semaphore(8)
+
+    async def post_one(service, key, assignment, grading_id, student_id, total_score):
+        final_points = scale_to_points(total_score, assignment)
+        async with sem:
+            try:
+                await run_in_threadpool(post_points, assignment, student_id, final_points)
+                results[grading_id] = {"grading_id": grading_id, "ok": True, "posted_grade": final_points}
+            except Exception as e:
+                service.invalidate(key[2], key[3])
+                results[grading_id] = {"grading_id": grading_id, "ok": False, "error": f"Failed to post grade to Canvas: {e}"}
+
+    async def post_group(key, posts):
+        canvas_base_url, canvas_api_token, course_id, assignment_id = key
+        service = CanvasClientService(canvas_base_url, canvas_api_token)
+        try:
+            course = await run_in_threadpool(service.get_course, course_id)
+            assignment = await run_in_threadpool(service.get_assignment, course, assignment_id)
+        except Exception as e:
+            for grading_id, _, _ in posts:
+                results[grading_id] = {"grading_id": grading_id, "ok": False, "error": f"Failed to fetch course/assignment: {e}"}
+            return
+        await asyncio.gather(*(post_one(service, key, assignment, *post) for post in posts))
+
+    await asyncio.gather(*(post_group(key, posts) for key, posts in groups.items()))
+    return {"results": [results[grading_id] for grading_id in req.grading_ids]}
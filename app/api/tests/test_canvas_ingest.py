@@ -4,8 +4,13 @@ Test script to ingest Canvas submissions from a specific assignment.
 Usage: python test_canvas_ingest.py
 """
 
+import asyncio
+import atexit
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
+import sys
 from dotenv import load_dotenv
 import os
 load_dotenv()
@@ -15,57 +20,77 @@ API_TOKEN = os.getenv("CANVAS_API_TOKEN")
 COURSE_ID = 175906
 ASSIGNMENT_ID = 790778
 
+# (course_id, assignment_id) pairs ingested concurrently
+ASSIGNMENTS = [
+    (COURSE_ID, ASSIGNMENT_ID),
+]
+MAX_CONCURRENT = 5
+
 # FastAPI endpoint (assumes server running locally)
 API_ENDPOINT = "http://127.0.0.1:8000/canvas/submissions/ingest"
 
-def test_ingest():
-    """Test the Canvas submissions ingest endpoint."""
+# One keep-alive session for every request this script makes
+_SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=20, pool_maxsize=20, max_retries=Retry(total=3, backoff_factor=0.3))
+_SESSION.mount("http://", _adapter)
+_SESSION.mount("https://", _adapter)
+_SESSION.headers["Content-Type"] = "application/json"
+atexit.register(_SESSION.close)
+
+def _result_lines(assignment_id, response):
+    yield f"[assignment {assignment_id}] Status Code: {response.status_code}"
+    yield f"Response Headers: {dict(response.headers)}\n"
     
+    if response.status_code == 200:
+        result = response.json()
+        yield "✅ SUCCESS!"
+        yield f"\nIngested {len(result.get('ingested', []))} submission(s):\n"
+        
+        for idx, sub in enumerate(result.get('ingested', []), 1):
+            yield f"  {idx}. Student ID: {sub.get('student_id')}"
+            yield f"     Student Name: {sub.get('student_name')}"
+            yield f"     DB Record ID: {sub.get('submission_db_id')}"
+            yield f"     Files: {len([f for f in sub.get('files', []) if isinstance(f, str)])}"
+            
+            # Show file paths
+            for file_path in sub.get('files', []):
+                if isinstance(file_path, str):
+                    yield f"       - {file_path}"
+                else:
+                    yield f"       - ERROR: {file_path}"
+            yield ""
+    else:
+        yield "❌ ERROR!"
+        yield f"Response: {response.text}"
+
+def _print_result(assignment_id, response):
+    # One write per assignment keeps concurrent reports from interleaving
+    sys.stdout.write("\n".join(_result_lines(assignment_id, response)) + "\n")
+
+async def _ingest_one(sem, course_id, assignment_id):
+    """Ingest a single assignment; the semaphore caps concurrent server load."""
     payload = {
         "canvas_base_url": CANVAS_BASE_URL,
         "api_token": API_TOKEN,
-        "course_id": COURSE_ID,
-        "assignment_id": ASSIGNMENT_ID
+        "course_id": course_id,
+        "assignment_id": assignment_id
         # Optional: "student_id": 12345  # to ingest only one student
     }
     
-    print(f"Testing Canvas ingestion for assignment {ASSIGNMENT_ID}...")
-    print(f"Endpoint: {API_ENDPOINT}")
-    print(f"Payload: {json.dumps({**payload, 'api_token': '***REDACTED***'}, indent=2)}")
-    print("\nSending request...\n")
+    print(f"Testing Canvas ingestion for assignment {assignment_id}...")
+    redacted = payload | {"api_token": "***REDACTED***"}
+    print(f"Payload: {json.dumps(redacted, indent=2)}")
     
     try:
-        response = requests.post(
-            API_ENDPOINT,
-            json=payload,
-            headers={"Content-Type": "application/json"},
-            timeout=120  # 2 minute timeout for large downloads
-        )
-        
-        print(f"Status Code: {response.status_code}")
-        print(f"Response Headers: {dict(response.headers)}\n")
-        
-        if response.status_code == 200:
-            result = response.json()
-            print("✅ SUCCESS!")
-            print(f"\nIngested {len(result.get('ingested', []))} submission(s):\n")
-            
-            for idx, sub in enumerate(result.get('ingested', []), 1):
-                print(f"  {idx}. Student ID: {sub.get('student_id')}")
-                print(f"     Student Name: {sub.get('student_name')}")
-                print(f"     DB Record ID: {sub.get('submission_db_id')}")
-                print(f"     Files: {len([f for f in sub.get('files', []) if isinstance(f, str)])}")
-                
-                # Show file paths
-                for file_path in sub.get('files', []):
-                    if isinstance(file_path, str):
-                        print(f"       - {file_path}")
-                    else:
-                        print(f"       - ERROR: {file_path}")
-                print()
-        else:
-            print("❌ ERROR!")
-            print(f"Response: {response.text}")
+        async with sem:
+            # Blocking call runs in a worker thread so other assignments overlap
+            response = await asyncio.to_thread(
+                _SESSION.post,
+                API_ENDPOINT,
+                json=payload,
+                timeout=120  # 2 minute timeout for large downloads
+            )
+        _print_result(assignment_id, response)
             
     except requests.exceptions.ConnectionError:
         print("❌ CONNECTION ERROR!")
@@ -74,5 +99,18 @@ def test_ingest():
     except Exception as e:
         print(f"❌ EXCEPTION: {e}")
 
+async def ingest_all(assignments=ASSIGNMENTS):
+    """Ingest every (course_id, assignment_id) pair concurrently."""
+    print(f"Endpoint: {API_ENDPOINT}")
+    print(f"Sending {len(assignments)} request(s)...\n")
+    sem = asyncio.Semaphore(MAX_CONCURRENT)
+    async with asyncio.TaskGroup() as tg:
+        for course_id, assignment_id in assignments:
+            tg.create_task(_ingest_one(sem, course_id, assignment_id))
+
+def test_ingest():
+    """Test the Canvas submissions ingest endpoint."""
+    asyncio.run(ingest_all())
+
 if __name__ == "__main__":
-    test_ingest()
\ No newline at end of file
+    test_ingest()
@@ -5,7 +5,9 @@ Tests the pdf_to_text function with sample PDFs.
 python -m app.api.tests.test_pdf_extractor
 """
 
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
 from ...utils.pdf_extractor import pdf_to_text
@@ -37,39 +39,40 @@ def test_pdf_extraction():
     
     print(f"Found {len(pdf_files)} PDF file(s) to test:\n")
     
-    # Process each PDF
-    for pdf_path in pdf_files:
-        print(f"Processing: {pdf_path.name}")
-        
-        try:
-            # Generate output filename
-            output_filename = pdf_path.stem + ".txt"
-            output_path = output_dir / output_filename
-            
-            # Extract text
-            result_path = pdf_to_text(str(pdf_path), str(output_path))
+    # Extract in parallel, one process per core; report as each file finishes
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+        tasks = {
+            ex.submit(pdf_to_text, str(p), str(output_dir / (p.stem + ".txt"))): p
+            for p in pdf_files
+        }
+        for future in as_completed(tasks):
+            pdf_path = tasks[future]
+            print(f"Processing: {pdf_path.name}")
             
-            # Read and display first 500 characters
-            with open(result_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                preview = content[:500]
+            try:
+                result_path = future.result()
                 
-            print(f"✅ SUCCESS")
-            print(f"   Output: {result_path}")
-            print(f"   Size: {len(content)} characters")
-            print(f"   Preview:\n")
-            print("-" * 60)
-            print(preview)
-            if len(content) > 500:
-                print(f"\n... ({len(content) - 500} more characters)")
-            print("-" * 60)
-            print()
-            
-        except Exception as e:
-            print(f"❌ ERROR: {e}")
-            import traceback
-            traceback.print_exc()
-            print()
+                # Read and display first 500 characters
+                size = os.path.getsize(result_path)
+                with open(result_path, 'r', encoding='utf-8') as f:
+                    preview = f.read(500)
+                    
+                print(f"✅ SUCCESS")
+                print(f"   Output: {result_path}")
+                print(f"   Size: {size} bytes")
+                print(f"   Preview:\n")
+                print("-" * 60)
+                print(preview)
+                if size > len(preview.encode('utf-8')):
+                    print(f"\n... ({size - len(preview.encode('utf-8'))} more bytes)")
+                print("-" * 60)
+                print()
+                
+            except Exception as e:
+                print(f"❌ ERROR: {e}")
+                import traceback
+                traceback.print_exc()
+                print()
 
 
 def test_with_sample_pdf():
@@ -103,10 +106,9 @@ def test_with_sample_pdf():
             result_path = pdf_to_text(str(pdf_path), str(output_path))
             
             # Show stats
-            with open(result_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            size = os.path.getsize(result_path)
             
-            print(f"✅ Extracted {len(content)} characters")
+            print(f"✅ Extracted {size} bytes")
             print(f"   Saved to: {output_path.relative_to(submissions_dir)}\n")
             
         except Exception as e:
@@ -1,42 +1,51 @@
 # auth.py
 
+import base64
 import hashlib
-from passlib.context import CryptContext
+import bcrypt
 import jwt
-from datetime import datetime, timedelta
+import time
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_ROUNDS = 12
+BCRYPT_MAX_BYTES = 72
 
 SECRET_KEY = "SUPER_SECRET_KEY"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+_ACCESS_TOKEN_EXPIRE_SECONDS = ACCESS_TOKEN_EXPIRE_MINUTES * 60
 
 
 def hash_password(password: str) -> str:
     # Convert to bytes
-    print("--- inside hash_password() ---")
-    print("password =", password)
-    print("bytes =", len(password.encode('utf-8')))
     pwd_bytes = password.encode("utf-8")
 
     # If password >72 bytes, hash with SHA256 first
-    if len(pwd_bytes) > 72:
-        password = hashlib.sha256(pwd_bytes).hexdigest()
+    if len(pwd_bytes) > BCRYPT_MAX_BYTES:
+        pwd_bytes = _prehash(pwd_bytes)
 
-    return pwd_context.hash(password)
+    return bcrypt.hashpw(pwd_bytes, bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode("ascii")
 
 
 def verify_password(password: str, hashed: str) -> bool:
     # Same logic on verification
     pwd_bytes = password.encode("utf-8")
+    hashed_bytes = hashed.encode("ascii")
 
-    if len(pwd_bytes) > 72:
-        password = hashlib.sha256(pwd_bytes).hexdigest()
+    if len(pwd_bytes) <= BCRYPT_MAX_BYTES:
+        return bcrypt.checkpw(pwd_bytes, hashed_bytes)
 
-    return pwd_context.verify(password, hashed)
+    if bcrypt.checkpw(_prehash(pwd_bytes), hashed_bytes):
+        return True
+    # Hashes created before the switch pre-hashed with the hex digest
+    legacy = hashlib.sha256(pwd_bytes).hexdigest().encode("ascii")
+    return bcrypt.checkpw(legacy, hashed_bytes)
+
+
+def _prehash(pwd_bytes: bytes) -> bytes:
+    # 44 bytes of base64 keeps the full SHA256 digest under bcrypt's 72-byte limit
+    return base64.b64encode(hashlib.sha256(pwd_bytes).digest())
 
 def create_access_token(data: dict):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode["exp"] = expire
+    # JWT "exp" is seconds since the epoch
+    to_encode = {**data, "exp": int(time.time()) + _ACCESS_TOKEN_EXPIRE_SECONDS}
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
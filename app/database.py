@@ -1,11 +1,100 @@
-from sqlmodel import SQLModel, create_engine
+import json
+import os
+from functools import partial
+
+from sqlalchemy import Index, event, func, inspect, select
+from sqlmodel import Session, SQLModel, create_engine
 
 DB_FILE = "db.sqlite"
 DATABASE_URL = f"sqlite:///{DB_FILE}"
 
 # echo=True will print SQL statements; you can set to False to reduce output
-engine = create_engine(DATABASE_URL, echo=False)
+engine = create_engine(
+    DATABASE_URL,
+    echo=False,
+    # Sessions are used from FastAPI's threadpool; wait on locks instead of failing fast
+    connect_args={"check_same_thread": False, "timeout": 30},
+    pool_size=10,
+    max_overflow=20,
+    # JSON columns (criteria, grading results) are stored as TEXT: skip the padding
+    json_serializer=partial(json.dumps, separators=(",", ":"), ensure_ascii=False),
+)
+
+
+# Read-only connections for the GET routes. Under WAL they read a snapshot and
+# never queue behind the writer; the file must already exist (init_db runs first).
+read_engine = create_engine(
+    f"sqlite:///file:{DB_FILE}?mode=ro&uri=true",
+    echo=False,
+    connect_args={"check_same_thread": False, "timeout": 30},
+    pool_size=os.cpu_count() or 4,
+    max_overflow=20,
+)
+
+
+def _set_cache_pragmas(cur) -> None:
+    cur.execute("PRAGMA cache_size=-65536")  # 64 MB
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.execute("PRAGMA mmap_size=268435456")  # 256 MB of the file read via mmap
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_conn, _connection_record) -> None:
+    """WAL lets readers run alongside a writer; NORMAL sync is safe under WAL."""
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    _set_cache_pragmas(cur)
+    cur.close()
+
+
+@event.listens_for(read_engine, "connect")
+def _set_read_pragmas(dbapi_conn, _connection_record) -> None:
+    """journal_mode is persistent in the file; the write engine has already set WAL."""
+    cur = dbapi_conn.cursor()
+    _set_cache_pragmas(cur)
+    cur.close()
+
+
+def _check_unique_index(index: Index) -> None:
+    """Refuse to build a unique index over rows that already break it."""
+    columns = list(index.columns)
+    stmt = select(*columns).group_by(*columns).having(func.count() > 1).limit(5)
+    with engine.connect() as conn:
+        duplicates = [row[0] if len(columns) == 1 else tuple(row) for row in conn.execute(stmt)]
+    if duplicates:
+        names = ", ".join(column.name for column in columns)
+        raise RuntimeError(
+            f"Cannot create unique index {index.name}: {index.table.name} has duplicate "
+            f"({names}) values, e.g. {duplicates}. Merge or delete the duplicate rows, then restart."
+        )
+
 
 def init_db() -> None:
     """Create database tables if they don't exist."""
     SQLModel.metadata.create_all(engine)
+    # create_all skips tables that already exist, so add any indexes declared
+    # after those tables were first created
+    inspector = inspect(engine)
+    for table in SQLModel.metadata.sorted_tables:
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            if index.unique:
+                _check_unique_index(index)
+            index.create(engine)
+
+
+def get_session():
+    """FastAPI dependency: one read-write Session per request, closed once the request is done."""
+    # Keep attributes loaded after commit: ids come back from the INSERT itself and
+    # every default is set in Python, so re-SELECTing a row just to return it is waste
+    with Session(engine, expire_on_commit=False) as session:
+        yield session
+
+
+def get_read_session():
+    """FastAPI dependency for routes that only read: a Session on the read-only engine."""
+    with Session(read_engine) as session:
+        yield session
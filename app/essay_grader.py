@@ -1,10 +1,64 @@
+import asyncio
+import hashlib
 import json
 import re
-from typing import Dict, List, Any, Tuple
-from anthropic import Anthropic
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, List, Any, Optional, Tuple
+from anthropic import Anthropic, AsyncAnthropic
 from rapidfuzz import fuzz
 import os
 
+from .utils.cache import TTLCache
+
+GRADING_MODEL = "claude-sonnet-4-5-20250929"
+GRADING_MAX_TOKENS = 4000
+GRADE_MANY_CONCURRENCY = 5
+
+RESPONSE_CACHE_TTL = 60 * 60
+
+_NON_SPACE_RE = re.compile(r'\S+')
+# "ID: description" on one line, both parts trimmed; the ID is checked with
+# isupper() so headings like "CRITERION 1" or "THESIS (20%)" still count
+_CRITERION_RE = re.compile(r'^[^\S\n]*([^:\n]*?)[^\S\n]*:[^\S\n]*(.*?)[^\S\n]*$', re.MULTILINE)
+_JSON_DECODER = json.JSONDecoder()
+_QUOTE_TABLE = str.maketrans({
+    '\u201c': '"', '\u201d': '"',
+    '\u2018': "'", '\u2019': "'",
+})
+
+# Raw model output keyed by (model, essay, rubric); grading the same pair
+# again re-parses the cached text instead of calling the API
+_RESPONSE_CACHE = TTLCache(256, RESPONSE_CACHE_TTL)
+
+@lru_cache(maxsize=32)
+def _parse_rubric(rubric_text: str) -> Tuple[Tuple[str, str], ...]:
+    """Parse rubric text once per distinct rubric; see EssayGrader.parse_rubric."""
+    criteria = {}
+
+    # Look for lines starting with criterion ID (e.g., "THESIS:")
+    for match in _CRITERION_RE.finditer(rubric_text):
+        criterion_id, description = match.groups()
+        if criterion_id.isupper():
+            criteria[criterion_id] = description
+
+    return tuple(criteria.items())
+
+
+def _format_criteria(criteria: Dict[str, str]) -> str:
+    return "\n".join([f"- {key}: {desc}" for key, desc in criteria.items()])
+
+
+@lru_cache(maxsize=None)
+def _shared_client(api_key: str) -> Anthropic:
+    """One client (and HTTP connection pool) per API key for the whole process."""
+    return Anthropic(api_key=api_key)
+
+
+@lru_cache(maxsize=None)
+def _shared_async_client(api_key: str) -> AsyncAnthropic:
+    return AsyncAnthropic(api_key=api_key)
+
 
 class EssayGrader:
     """Service for grading essays using Claude AI with text highlighting."""
@@ -14,7 +68,12 @@ class EssayGrader:
         self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
         if not self.api_key:
             raise ValueError("ANTHROPIC_API_KEY environment variable must be set")
-        self.client = Anthropic(api_key=self.api_key)
+        self.client = _shared_client(self.api_key)
+        self._cache = _RESPONSE_CACHE
+
+    @property
+    def async_client(self) -> AsyncAnthropic:
+        return _shared_async_client(self.api_key)
 
     def parse_rubric(self, rubric_text: str) -> Dict[str, str]:
         """
@@ -26,55 +85,111 @@ class EssayGrader:
         Returns:
             Dictionary mapping criterion IDs to descriptions
         """
-        criteria = {}
-        lines = rubric_text.strip().split('\n')
+        return dict(_parse_rubric(rubric_text))
 
-        for line in lines:
-            line = line.strip()
-            # Look for lines starting with criterion ID (e.g., "THESIS:")
-            if ':' in line and line.split(':')[0].isupper():
-                parts = line.split(':', 1)
-                criterion_id = parts[0].strip()
-                description = parts[1].strip()
-                criteria[criterion_id] = description
-
-        return criteria
-
-    def grade_essay(self, essay_text: str, rubric_text: str) -> Dict[str, Any]:
+    def grade_essay(self, essay_text: str, rubric_text: str, force_refresh: bool = False) -> Dict[str, Any]:
         """
         Grade an essay based on a rubric and identify relevant text spans.
 
         Args:
             essay_text: The essay content to grade
             rubric_text: The rubric text with grading criteria
+            force_refresh: Call the API even if this pair was graded recently
 
         Returns:
             Dictionary with grading results including scores, feedback, and highlights
         """
         criteria = self.parse_rubric(rubric_text)
+        return self.grade_essay_from_criteria(essay_text, criteria, force_refresh)
 
-        # Construct the grading prompt
-        prompt = self._build_grading_prompt(essay_text, criteria)
+    def grade_essay_from_criteria(self, essay_text: str, criteria: Dict[str, str],
+                                  force_refresh: bool = False) -> Dict[str, Any]:
+        """Grade an essay against already-parsed criteria (e.g. Rubric.criteria)."""
+        key = self._cache_key(essay_text, criteria)
+        response_text = None if force_refresh else self._cache.get(key)
+        cache_hit = response_text is not None
 
-        # Call Claude API
-        message = self.client.messages.create(
-            model="claude-sonnet-4-5-20250929",
-            max_tokens=4000,
-            messages=[{
-                "role": "user",
-                "content": prompt
-            }]
-        )
+        if not cache_hit:
+            # Construct the grading prompt
+            prompt = self._build_grading_prompt(essay_text, criteria)
+
+            # Call Claude API, collecting text as it streams in
+            with self.client.messages.stream(**self._message_params(prompt)) as stream:
+                response_text = "".join(stream.text_stream)
 
         # Parse the response
-        response_text = message.content[0].text
         grading_results = self._parse_grading_response(response_text, essay_text)
+        # Only store fresh responses (once they parse): re-setting on a hit would
+        # restart the TTL, so a frequently graded pair would never expire
+        if not cache_hit:
+            self._cache.set(key, response_text)
+
+        return grading_results
+
+    async def grade_essay_async(self, essay_text: str, rubric_text: str,
+                                force_refresh: bool = False) -> Dict[str, Any]:
+        """Async variant of grade_essay using the shared AsyncAnthropic client."""
+        criteria = self.parse_rubric(rubric_text)
+        return await self.grade_essay_from_criteria_async(essay_text, criteria, force_refresh)
+
+    async def grade_essay_from_criteria_async(self, essay_text: str, criteria: Dict[str, str],
+                                              force_refresh: bool = False) -> Dict[str, Any]:
+        """Async variant of grade_essay_from_criteria."""
+        key = self._cache_key(essay_text, criteria)
+        response_text = None if force_refresh else self._cache.get(key)
+        cache_hit = response_text is not None
+
+        if not cache_hit:
+            prompt = self._build_grading_prompt(essay_text, criteria)
 
+            async with self.async_client.messages.stream(**self._message_params(prompt)) as stream:
+                response_text = "".join([text async for text in stream.text_stream])
+
+        # Highlight matching is CPU-bound; keep it off the event loop thread
+        grading_results = await asyncio.to_thread(self._parse_grading_response, response_text, essay_text)
+        if not cache_hit:
+            self._cache.set(key, response_text)
         return grading_results
 
+    async def grade_many(self, pairs: List[Tuple[str, Dict[str, str]]],
+                         force_refresh: bool = False) -> List[Dict[str, Any]]:
+        """
+        Grade several (essay_text, criteria) pairs concurrently.
+
+        Criteria are already parsed (e.g. Rubric.criteria), as for
+        grade_essay_from_criteria. At most GRADE_MANY_CONCURRENCY requests
+        are in flight at once. Results are returned in the same order as pairs.
+        """
+        sem = asyncio.Semaphore(GRADE_MANY_CONCURRENCY)
+
+        async def grade_one(essay_text: str, criteria: Dict[str, str]) -> Dict[str, Any]:
+            async with sem:
+                return await self.grade_essay_from_criteria_async(essay_text, criteria, force_refresh)
+
+        return await asyncio.gather(*(grade_one(e, c) for e, c in pairs))
+
+    @staticmethod
+    def _cache_key(essay_text: str, criteria: Dict[str, str]) -> str:
+        # Keyed on the criteria as sent, so rubric files that parse the same share entries
+        h = hashlib.sha256()
+        for part in (GRADING_MODEL, _format_criteria(criteria), essay_text):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _message_params(self, prompt: str) -> Dict[str, Any]:
+        return {
+            "model": GRADING_MODEL,
+            "max_tokens": GRADING_MAX_TOKENS,
+            "messages": [{
+                "role": "user",
+                "content": prompt
+            }]
+        }
+
     def _build_grading_prompt(self, essay_text: str, criteria: Dict[str, str]) -> str:
         """Build the prompt for Claude to grade the essay."""
-        criteria_list = "\n".join([f"- {key}: {desc}" for key, desc in criteria.items()])
+        criteria_list = _format_criteria(criteria)
 
         prompt = f"""You are an expert essay grader. Please grade the following essay based on the provided rubric criteria.
 
@@ -118,7 +233,9 @@ Respond ONLY with valid JSON, no additional text."""
 
         return prompt
 
-    def _find_text_position(self, essay_text: str, quoted_text: str, threshold: int = 75) -> Tuple[int, int, str]:
+    def _find_text_position(self, essay_text: str, quoted_text: str, threshold: int = 75,
+                            essay_lower: Optional[str] = None,
+                            normalized_essay: Optional[str] = None) -> Tuple[int, int, str]:
         """
         Find the position of quoted text in the essay using exact and fuzzy matching.
 
@@ -126,6 +243,8 @@ Respond ONLY with valid JSON, no additional text."""
             essay_text: The full essay text
             quoted_text: The text to find (from LLM response)
             threshold: Minimum similarity score for fuzzy matching (0-100)
+            essay_lower: Precomputed essay_text.lower(), reused across highlights
+            normalized_essay: Precomputed whitespace-normalized essay_text
 
         Returns:
             Tuple of (start_position, end_position, actual_text_found)
@@ -138,98 +257,137 @@ Respond ONLY with valid JSON, no additional text."""
 
         # Step 2: Try with normalized whitespace
         normalized_quote = ' '.join(quoted_text.split())
-        normalized_essay = ' '.join(essay_text.split())
+        if normalized_essay is None:
+            normalized_essay = ' '.join(essay_text.split())
 
         start_pos = normalized_essay.find(normalized_quote)
-        if start_pos != -1:
-            # Map back to original essay position
-            # Count non-whitespace chars to find position in original
+        if start_pos != -1 and normalized_quote:
+            # Map the first and last matched characters back to the original essay
             original_pos = self._map_normalized_position(essay_text, normalized_essay, start_pos)
-            if original_pos != -1:
+            last_pos = self._map_normalized_position(
+                essay_text, normalized_essay, start_pos + len(normalized_quote) - 1)
+            if original_pos != -1 and last_pos != -1:
                 # Find the actual text in the original essay
-                actual_text = essay_text[original_pos:original_pos + len(normalized_quote)]
-                return (original_pos, original_pos + len(actual_text), actual_text)
-
-        # Step 3: Fuzzy matching with sliding window
-        quote_len = len(quoted_text)
-        best_score = 0
-        best_start = -1
-        best_text = quoted_text
-
-        # Use a sliding window approach
-        window_size = min(len(quoted_text) + 50, len(essay_text))  # Allow some length variance
-        step_size = max(1, quote_len // 4)  # Overlap windows for better coverage
-
-        for i in range(0, len(essay_text) - quote_len + 1, step_size):
-            # Try windows of varying sizes around the expected length
-            for window_len in [quote_len, int(quote_len * 0.8), int(quote_len * 1.2)]:
-                if i + window_len > len(essay_text):
-                    continue
-
-                window = essay_text[i:i + window_len]
-                score = fuzz.ratio(quoted_text.lower(), window.lower())
-
-                if score > best_score:
-                    best_score = score
-                    best_start = i
-                    best_text = window
+                actual_text = essay_text[original_pos:last_pos + 1]
+                return (original_pos, last_pos + 1, actual_text)
+
+        # Step 3: Fuzzy matching - best-aligned substring of the essay (in C)
+        if essay_lower is None:
+            essay_lower = essay_text.lower()
+        # Offsets index essay_text, so only compare lowercased text when
+        # lowering kept every character in place
+        # score_cutoff lets RapidFuzz skip alignments that cannot reach the
+        # threshold; it returns None when nothing qualifies
+        if len(essay_lower) == len(essay_text):
+            align = fuzz.partial_ratio_alignment(quoted_text.lower(), essay_lower, score_cutoff=threshold)
+        else:
+            align = fuzz.partial_ratio_alignment(quoted_text, essay_text, score_cutoff=threshold)
 
         # Accept match if above threshold
-        if best_score >= threshold:
-            return (best_start, best_start + len(best_text), best_text)
+        if align is not None:
+            # The aligned window can spill onto surrounding whitespace; trim it so
+            # the highlight starts and ends on the quoted words
+            start, end = align.dest_start, align.dest_end
+            while start < end and essay_text[start].isspace():
+                start += 1
+            while end > start and essay_text[end - 1].isspace():
+                end -= 1
+            if start < end:
+                return (start, end, essay_text[start:end])
 
         # Step 4: No good match found
         return (-1, -1, quoted_text)
 
     def _map_normalized_position(self, original: str, normalized: str, norm_pos: int) -> int:
         """Map a position in normalized text back to original text position."""
-        # This is a simplified mapping - count non-whitespace characters
-        char_count = 0
-        for i, char in enumerate(original):
-            if not char.isspace():
-                if char_count == norm_pos:
-                    return i
-                char_count += 1
-        return -1
+        # normalized is the original's whitespace-separated tokens joined by
+        # single spaces: find which token norm_pos falls in, then the same
+        # token in the original
+        if not 0 <= norm_pos < len(normalized) or normalized[norm_pos] == ' ':
+            return -1
+        token_index = normalized.count(' ', 0, norm_pos)
+        offset = norm_pos - (normalized.rfind(' ', 0, norm_pos) + 1)
+        token = next(islice(_NON_SPACE_RE.finditer(original), token_index, None), None)
+        if token is None:
+            return -1
+        return token.start() + offset
+
+    @staticmethod
+    def _decode_json_object(response_text: str) -> Dict[str, Any]:
+        # Decode the first JSON object in the response; any prose before
+        # the opening '{' or after the closing '}' is ignored
+        start = response_text.find('{')
+        grading_data, _ = _JSON_DECODER.raw_decode(response_text, max(start, 0))
+        return grading_data
 
     def _parse_grading_response(self, response_text: str, essay_text: str) -> Dict[str, Any]:
         """Parse Claude's response and add character positions for highlights using fuzzy matching."""
         # Extract JSON from response
         try:
-            # Try to find JSON in the response
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                response_text = json_match.group()
-
-            # Normalize curly quotes to straight quotes for JSON parsing
-            response_text = response_text.replace('"', '"').replace('"', '"').replace(''', "'").replace(''', "'")
-
-            grading_data = json.loads(response_text)
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Failed to parse grading response as JSON: {e}\nResponse: {response_text}")
+            grading_data = self._decode_json_object(response_text)
+        except json.JSONDecodeError:
+            # Curly quotes used as JSON delimiters: normalize them and retry.
+            # Not done up front, as it would corrupt curly quotes inside strings.
+            response_text = response_text.translate(_QUOTE_TABLE)
+            try:
+                grading_data = self._decode_json_object(response_text)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Failed to parse grading response as JSON: {e}\nResponse: {response_text}")
 
         # Add character positions to highlights using fuzzy matching
-        for criterion_result in grading_data.get("criteria_results", []):
-            for highlight in criterion_result.get("highlights", []):
-                quoted_text = highlight["text"]
+        highlights = [
+            highlight
+            for criterion_result in grading_data.get("criteria_results", [])
+            for highlight in criterion_result.get("highlights", [])
+        ]
+        positions = self._locate_quotes(essay_text, {h["text"] for h in highlights})
 
-                # Use fuzzy matching to find the text
-                start_pos, end_pos, actual_text = self._find_text_position(essay_text, quoted_text)
+        for highlight in highlights:
+            start_pos, end_pos, actual_text = positions[highlight["text"]]
 
-                # Update highlight with positions and actual matched text
-                highlight["start"] = start_pos
-                highlight["end"] = end_pos
-                highlight["text"] = actual_text  # Update to actual matched text
+            # Update highlight with positions and actual matched text
+            highlight["start"] = start_pos
+            highlight["end"] = end_pos
+            highlight["text"] = actual_text  # Update to actual matched text
 
-                # Add note only if not found
-                if start_pos == -1:
-                    highlight["note"] = "Text not found in essay (fuzzy match failed)"
+            # Add note only if not found
+            if start_pos == -1:
+                highlight["note"] = "Text not found in essay (fuzzy match failed)"
 
         return grading_data
 
+    def _locate_quotes(self, essay_text: str, quotes) -> Dict[str, Tuple[int, int, str]]:
+        """
+        Locate each distinct quote in the essay.
+
+        Exact hits are resolved first with str.find; only the quotes that miss
+        go through the normalized/fuzzy steps of _find_text_position, which
+        share one lowercased and one whitespace-normalized copy of the essay.
+        """
+        positions: Dict[str, Tuple[int, int, str]] = {}
+        misses = []
+        for quote in quotes:
+            start_pos = essay_text.find(quote)
+            if start_pos != -1:
+                positions[quote] = (start_pos, start_pos + len(quote), quote)
+            else:
+                misses.append(quote)
+
+        if misses:
+            essay_lower = essay_text.lower()
+            normalized_essay = ' '.join(essay_text.split())
+            for quote in misses:
+                positions[quote] = self._find_text_position(
+                    essay_text, quote,
+                    essay_lower=essay_lower, normalized_essay=normalized_essay)
+
+        return positions
+
     def calculate_total_score(self, grading_results: Dict[str, Any]) -> float:
         """Calculate the total score from individual criterion scores."""
-        scores = [cr["score"] for cr in grading_results.get("criteria_results", [])]
-        if not scores:
-            return 0.0
-        return sum(scores) / len(scores)
+        total = 0.0
+        count = 0
+        for cr in grading_results.get("criteria_results", ()):
+            total += cr["score"]
+            count += 1
+        return total / count if count else 0.0
@@ -1,8 +1,13 @@
+import asyncio
 import time
 import jwt
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
+from sqlalchemy import insert
 from sqlmodel import Session, select
 from .database import engine
 from .models import User
@@ -41,50 +46,59 @@ def decode(token: str):
     except:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+# ----------------------
+# PASSWORD HASHING POOL
+# ----------------------
+# bcrypt releases the GIL, so threads run hashes in parallel; sizing the pool
+# to the core count keeps a burst of logins from starving the shared threadpool
+_BCRYPT_POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="bcrypt")
+
 # ----------------------
 # SIGNUP (DB VERSION)
 # ----------------------
-def signup(data: SignUpSchema):
-    with Session(engine) as session:
+async def signup(data: SignUpSchema):
+    # hash password
+    loop = asyncio.get_running_loop()
+    hashed = await loop.run_in_executor(_BCRYPT_POOL, hash_password, data.password)
 
-        # check if user exists
-        existing = session.exec(
-            select(User).where(User.email == data.email)
-        ).first()
+    created_id = await run_in_threadpool(_insert_user, data, hashed)
+    if created_id is None:
+        raise HTTPException(status_code=400, detail="Email already registered")
 
-        if existing:
-            raise HTTPException(status_code=400, detail="Email already registered")
+    # return JWT
+    return {"token": sign(data.email)}
 
-        # hash password
-        hashed = hash_password(data.password)
+def _insert_user(data: SignUpSchema, hashed: str) -> Optional[int]:
+    with Session(engine) as session:
 
-        # create user
-        user = User(
-            name=data.name,
-            email=data.email,
-            hashed_password=hashed,
+        # create user; the unique email index turns a duplicate into a no-op
+        stmt = (
+            insert(User)
+            .prefix_with("OR IGNORE")
+            .values(name=data.name, email=data.email, hashed_password=hashed)
+            .returning(User.id)
         )
-
-        session.add(user)
+        created_id = session.execute(stmt).scalar_one_or_none()
         session.commit()
-        session.refresh(user)
-
-        # return JWT
-        return {"token": sign(user.email)}
+        return created_id
 
 # ----------------------
 # LOGIN
 # ----------------------
-def signin(data: SignInSchema):
-    with Session(engine) as session:
-        user = session.exec(
-            select(User).where(User.email == data.email)
-        ).first()
+async def signin(data: SignInSchema):
+    hashed = await run_in_threadpool(_get_password_hash, data.email)
+
+    if hashed is None:
+        raise HTTPException(status_code=400, detail="Invalid email or password")
 
-        if not user:
-            raise HTTPException(status_code=400, detail="Invalid email or password")
+    loop = asyncio.get_running_loop()
+    if not await loop.run_in_executor(_BCRYPT_POOL, verify_password, data.password, hashed):
+        raise HTTPException(status_code=400, detail="Invalid email or password")
 
-        if not verify_password(data.password, user.hashed_password):
-            raise HTTPException(status_code=400, detail="Invalid email or password")
+    return {"token": sign(data.email)}
 
-        return {"token": sign(user.email)}
+def _get_password_hash(email: str) -> Optional[str]:
+    with Session(engine) as session:
+        return session.scalar(
+            select(User.hashed_password).where(User.email == email).limit(1)
+        )
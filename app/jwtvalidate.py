@@ -1,18 +1,40 @@
+import hashlib
+import hmac
+import time
 from fastapi import Request, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from .jwtsign import decode
+from .utils.cache import TTLCache
+
+# Recently verified tokens, keyed by a hash of their signature segment, so
+# repeat requests with the same token skip the HMAC verification.
+_VERIFIED_TOKENS = TTLCache(maxsize=1024, ttl=60)
 
 class Bearer(HTTPBearer):
     def __init__(self, auto_error: bool = True):
         super().__init__(auto_error=auto_error)
 
     def validate(self, jwtoken: str):
+        # compare_digest only accepts ASCII str, so compare the tokens as bytes
+        token_bytes = jwtoken.encode()
+        key = hashlib.blake2b(token_bytes.rsplit(b".", 1)[-1], digest_size=16).digest()
+        cached = _VERIFIED_TOKENS.get(key)
+        if cached is not None and hmac.compare_digest(cached[0], token_bytes):
+            return cached[1]
+
         try:
             payload = decode(jwtoken)
-            return payload
         except:
             return None
 
+        # Never cache a token past its own expiry
+        ttl = _VERIFIED_TOKENS.ttl
+        if payload.get("exp"):
+            ttl = min(ttl, payload["exp"] - time.time())
+        if ttl > 0:
+            _VERIFIED_TOKENS.set(key, (token_bytes, payload), ttl=ttl)
+        return payload
+
     async def __call__(self, request: Request):
         credentials: HTTPAuthorizationCredentials = await super().__call__(request)
 
@@ -1,148 +1,134 @@
-from typing import Optional
+import codecs
+from functools import lru_cache
+from typing import List, Optional
 import os
 from dotenv import load_dotenv
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends
+from fastapi import APIRouter, FastAPI, HTTPException, UploadFile, File, Form, Depends, BackgroundTasks, Query, Body
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 from sqlmodel import Session, select
-from sqlalchemy import func
+from sqlalchemy import delete, func, true
 
-from .database import engine, init_db
+from .database import engine, read_engine, get_session, get_read_session, init_db
 from .models import Item, Essay, Rubric, Grading, User, Submission
 from .essay_grader import EssayGrader
-from .api.canvas import router as canvas_router, CanvasClientService
+from .api.canvas import (
+    router as canvas_router, CanvasClientService, canvas_context, post_points, scale_to_points, shutdown_executors,
+)
 from .jwtsign import SignUpSchema, SignInSchema, signup, signin, decode
 from .jwtvalidate import Bearer
 
 
-app = FastAPI(title="FastAPI + SQLite (SQLModel) example")
 load_dotenv()
 
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        "http://localhost:5173",  # Vite dev server
-        "http://localhost:5174",  # Vite alternative port
-        "http://localhost:3000",  # Alternative dev port
-        "http://127.0.0.1:5173",
-        "http://127.0.0.1:5174",
-        "http://127.0.0.1:3000",
-    ],
-    allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
-    allow_headers=["*"],
-    expose_headers=["*"],
-)
-
-app.include_router(canvas_router)
+# Routes live on a router; create_app() at the bottom of this module mounts them
+router = APIRouter()
 
 # Initialize Bearer authentication
 auth = Bearer()
 
+UPLOAD_CHUNK_SIZE = 64 * 1024
 
-@app.on_event("startup")
-def on_startup():
-    init_db()
+# Largest /grade/batch request accepted; each item is a Claude call and two row loads
+MAX_GRADE_BATCH_ITEMS = 50
 
+# One grader for the whole app, built on first use (after .env is loaded)
+@lru_cache(maxsize=1)
+def get_grader() -> EssayGrader:
+    return EssayGrader()
 
-@app.get("/")
+
+@router.get("/")
 def root():
     return {"ok": True, "message": "FastAPI + SQLite (SQLModel)", "docs": "/docs"}
 
 
-@app.get("/ping")
+@router.get("/ping")
 def ping():
     return {"ping": "pong"}
 
 
-@app.get("/health")
+@router.get("/health")
 def health():
     try:
         # quick DB reachability check
-        with Session(engine) as session:
+        with Session(read_engine) as session:
             session.exec(select(Item).limit(1)).first()
         return {"ok": True, "database": "reachable"}
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
 
-@app.post("/items/", response_model=Item)
-def create_item(item: Item):
-    with Session(engine) as session:
-        session.add(item)
-        session.commit()
-        session.refresh(item)
-        return item
-
-
-@app.get("/items/", response_model=list[Item])
-def read_items():
-    with Session(engine) as session:
-        statement = select(Item)
-        items = session.exec(statement).all()
-        return items
-
-
-@app.get("/items/count")
-def items_count():
-    with Session(engine) as session:
-        count = session.exec(select(func.count()).select_from(Item)).one()
-        return {"count": count}
-
-
-@app.get("/items/search", response_model=list[Item])
-def search_items(q: Optional[str] = None, name: Optional[str] = None):
-    with Session(engine) as session:
-        stmt = select(Item)
-        if q:
-            stmt = stmt.where((Item.name.contains(q)) | (Item.description.contains(q)))
-        if name:
-            stmt = stmt.where(Item.name == name)
-        items = session.exec(stmt).all()
-        return items
-
-
-@app.get("/items/{item_id}", response_model=Item)
-def read_item(item_id: int):
-    with Session(engine) as session:
-        item = session.get(Item, item_id)
-        if not item:
-            raise HTTPException(status_code=404, detail="Item not found")
-        return item
-
-
-@app.put("/items/{item_id}", response_model=Item)
-def update_item(item_id: int, item_data: Item):
-    with Session(engine) as session:
-        item = session.get(Item, item_id)
-        if not item:
-            raise HTTPException(status_code=404, detail="Item not found")
-        item.name = item_data.name
-        item.description = item_data.description
-        session.add(item)
-        session.commit()
-        session.refresh(item)
-        return item
+@router.post("/items/", response_model=Item)
+def create_item(item: Item, session: Session = Depends(get_session)):
+    session.add(item)
+    session.commit()
+    return item
 
 
-@app.delete("/items/{item_id}")
-def delete_item(item_id: int):
-    with Session(engine) as session:
-        item = session.get(Item, item_id)
-        if not item:
-            raise HTTPException(status_code=404, detail="Item not found")
-        session.delete(item)
-        session.commit()
-        return {"ok": True}
+@router.get("/items/", response_model=list[Item])
+def read_items(limit: int = Query(100, ge=1, le=1000), offset: int = Query(0, ge=0),
+               session: Session = Depends(get_read_session)):
+    statement = select(Item).order_by(Item.id).offset(offset).limit(limit)
+    items = session.exec(statement).all()
+    return items
+
+
+@router.get("/items/count")
+def items_count(session: Session = Depends(get_read_session)):
+    count = session.exec(select(func.count()).select_from(Item)).one()
+    return {"count": count}
+
+
+@router.get("/items/search", response_model=list[Item])
+def search_items(q: Optional[str] = None, name: Optional[str] = None, session: Session = Depends(get_read_session)):
+    stmt = select(Item)
+    if q:
+        stmt = stmt.where((Item.name.contains(q)) | (Item.description.contains(q)))
+    if name:
+        stmt = stmt.where(Item.name == name)
+    items = session.exec(stmt).all()
+    return items
+
+
+@router.get("/items/{item_id}", response_model=Item)
+def read_item(item_id: int, session: Session = Depends(get_read_session)):
+    item = session.get(Item, item_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return item
+
+
+@router.put("/items/{item_id}", response_model=Item)
+def update_item(item_id: int, item_data: Item, session: Session = Depends(get_session)):
+    item = session.get(Item, item_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    item.name = item_data.name
+    item.description = item_data.description
+    session.add(item)
+    session.commit()
+    return item
+
+
+@router.delete("/items/{item_id}")
+def delete_item(item_id: int, session: Session = Depends(get_session)):
+    item = session.get(Item, item_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    session.delete(item)
+    session.commit()
+    return {"ok": True}
 
 
 # ============================================================================
 # Essay Grading Endpoints
 # ============================================================================
 
-@app.post("/essays/load-from-folder", response_model=list[Essay])
-def load_essays_from_folder(payload: dict = Depends(auth)):
+@router.post("/essays/load-from-folder", response_model=list[Essay])
+def load_essays_from_folder(payload: dict = Depends(auth), session: Session = Depends(get_session)):
     """Load all essays from the example_essays folder."""
     user_email = payload.get("email")
     essays_folder = "example_essays"
@@ -151,258 +137,390 @@ def load_essays_from_folder(payload: dict = Depends(auth)):
     if not os.path.exists(essays_folder):
         raise HTTPException(status_code=404, detail="Example essays folder not found")
 
-    with Session(engine) as session:
-        for filename in os.listdir(essays_folder):
-            if filename.endswith('.txt'):
-                filepath = os.path.join(essays_folder, filename)
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        essay_text = f.read()
-
-                    essay = Essay(
-                        filename=filename,
-                        content=essay_text,
-                        created_by=user_email
-                    )
-                    session.add(essay)
-                    loaded_essays.append(essay)
-                except Exception as e:
-                    print(f"Error loading {filename}: {e}")
+    for filename in os.listdir(essays_folder):
+        if filename.endswith('.txt'):
+            filepath = os.path.join(essays_folder, filename)
+            try:
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    essay_text = f.read()
+
+                essay = Essay(
+                    filename=filename,
+                    content=essay_text,
+                    created_by=user_email
+                )
+                session.add(essay)
+                loaded_essays.append(essay)
+            except Exception as e:
+                print(f"Error loading {filename}: {e}")
+
+    session.commit()
+
+    return loaded_essays
 
-        session.commit()
-        for essay in loaded_essays:
-            session.refresh(essay)
 
-        return loaded_essays
+async def _read_upload_as_text(file: UploadFile) -> str:
+    """Decode an uploaded file as UTF-8 chunk by chunk instead of buffering the raw bytes."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    parts = []
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        parts.append(decoder.decode(chunk))
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts)
 
 
-@app.post("/essays/", response_model=Essay)
+@router.post("/essays/", response_model=Essay)
 async def upload_essay(file: UploadFile = File(...), payload: dict = Depends(auth)):
     """Upload an essay text file."""
-    content = await file.read()
-    essay_text = content.decode('utf-8')
+    essay_text = await _read_upload_as_text(file)
     user_email = payload.get("email")
 
-    with Session(engine) as session:
-        essay = Essay(
-            filename=file.filename,
-            content=essay_text,
-            created_by=user_email
-        )
-        session.add(essay)
-        session.commit()
-        session.refresh(essay)
-        return essay
+    essay = Essay(
+        filename=file.filename,
+        content=essay_text,
+        created_by=user_email
+    )
+    return await run_in_threadpool(_save_row, essay)
 
 
-@app.get("/essays/", response_model=list[Essay])
-def list_essays(payload: dict = Depends(auth)):
+@router.get("/essays/", response_model=list[Essay])
+def list_essays(limit: int = Query(100, ge=1, le=1000), offset: int = Query(0, ge=0),
+                payload: dict = Depends(auth), session: Session = Depends(get_read_session)):
     """List essays uploaded by the authenticated user."""
     user_email = payload.get("email")
-    with Session(engine) as session:
-        essays = session.exec(
-            select(Essay).where(Essay.created_by == user_email)
-        ).all()
-        return essays
+    essays = session.exec(
+        select(Essay).where(Essay.created_by == user_email)
+        .order_by(Essay.id).offset(offset).limit(limit)
+    ).all()
+    return essays
 
 
-@app.get("/essays/{essay_id}", response_model=Essay)
-def get_essay(essay_id: int, payload: dict = Depends(auth)):
+@router.get("/essays/{essay_id}", response_model=Essay)
+def get_essay(essay_id: int, payload: dict = Depends(auth), session: Session = Depends(get_read_session)):
     """Get a specific essay by ID (must be uploaded by the authenticated user)."""
     user_email = payload.get("email")
-    with Session(engine) as session:
-        essay = session.get(Essay, essay_id)
-        if not essay:
-            raise HTTPException(status_code=404, detail="Essay not found")
-        if essay.created_by != user_email:
-            raise HTTPException(status_code=403, detail="Access denied")
-        return essay
+    essay = session.get(Essay, essay_id)
+    if not essay:
+        raise HTTPException(status_code=404, detail="Essay not found")
+    if essay.created_by != user_email:
+        raise HTTPException(status_code=403, detail="Access denied")
+    return essay
 
 
-@app.delete("/essays/")
-def delete_all_essays():
+@router.delete("/essays/")
+def delete_all_essays(session: Session = Depends(get_session)):
     """Delete all essays from the database."""
-    with Session(engine) as session:
-        essays = session.exec(select(Essay)).all()
-        count = len(essays)
-        for essay in essays:
-            session.delete(essay)
-        session.commit()
-        return {"ok": True, "deleted": count}
+    result = session.execute(delete(Essay))
+    session.commit()
+    return {"ok": True, "deleted": result.rowcount}
 
 
-@app.post("/rubrics/", response_model=Rubric)
+@router.post("/rubrics/", response_model=Rubric)
 async def upload_rubric(file: UploadFile = File(...), payload: dict = Depends(auth)):
     """Upload a rubric text file."""
-    content = await file.read()
-    rubric_text = content.decode('utf-8')
+    rubric_text = await _read_upload_as_text(file)
     user_email = payload.get("email")
 
     # Parse the rubric
-    grader = EssayGrader()
+    grader = get_grader()
     criteria = grader.parse_rubric(rubric_text)
 
-    with Session(engine) as session:
-        rubric = Rubric(
-            name=file.filename,
-            content=rubric_text,
-            criteria=criteria,
-            created_by=user_email
-        )
-        session.add(rubric)
-        session.commit()
-        session.refresh(rubric)
-        return rubric
+    rubric = Rubric(
+        name=file.filename,
+        content=rubric_text,
+        criteria=criteria,
+        created_by=user_email
+    )
+    return await run_in_threadpool(_save_row, rubric)
 
 
-@app.get("/rubrics/", response_model=list[Rubric])
-def list_rubrics(payload: dict = Depends(auth)):
+@router.get("/rubrics/", response_model=list[Rubric])
+def list_rubrics(limit: int = Query(100, ge=1, le=1000), offset: int = Query(0, ge=0),
+                 payload: dict = Depends(auth), session: Session = Depends(get_read_session)):
     """List rubrics uploaded by the authenticated user."""
     user_email = payload.get("email")
-    with Session(engine) as session:
-        rubrics = session.exec(
-            select(Rubric).where(Rubric.created_by == user_email)
-        ).all()
-        return rubrics
+    rubrics = session.exec(
+        select(Rubric).where(Rubric.created_by == user_email)
+        .order_by(Rubric.id).offset(offset).limit(limit)
+    ).all()
+    return rubrics
 
 
-@app.get("/rubrics/{rubric_id}", response_model=Rubric)
-def get_rubric(rubric_id: int, payload: dict = Depends(auth)):
+@router.get("/rubrics/{rubric_id}", response_model=Rubric)
+def get_rubric(rubric_id: int, payload: dict = Depends(auth), session: Session = Depends(get_read_session)):
     """Get a specific rubric by ID (must be uploaded by the authenticated user)."""
     user_email = payload.get("email")
-    with Session(engine) as session:
-        rubric = session.get(Rubric, rubric_id)
-        if not rubric:
-            raise HTTPException(status_code=404, detail="Rubric not found")
-        if rubric.created_by != user_email:
-            raise HTTPException(status_code=403, detail="Access denied")
-        return rubric
+    rubric = session.get(Rubric, rubric_id)
+    if not rubric:
+        raise HTTPException(status_code=404, detail="Rubric not found")
+    if rubric.created_by != user_email:
+        raise HTTPException(status_code=403, detail="Access denied")
+    return rubric
+
+
+def _post_grade_to_canvas(submission_id: Optional[int], total_score: float) -> None:
+    """Post a grade back to Canvas when the essay came from an ingested Submission; never raises."""
+    # Attempt automatic post to Canvas if this essay came from an ingested Submission.
+    # Robust behavior:
+    # - Prefer credentials saved on the Submission.
+    # - Fall back to environment variables CANVAS_BASE_URL / CANVAS_API_TOKEN / CANVAS_COURSE_ID.
+    try:
+        submission = None
+        if submission_id:
+            with Session(engine) as session:
+                submission = session.get(Submission, submission_id)
+
+        if not submission:
+            # Nothing to do
+            pass
+        else:
+            # Determine Canvas connection info (prefer submission values)
+            canvas_base_url, canvas_api_token, course_id = canvas_context(submission)
+
+            if not canvas_base_url or not canvas_api_token:
+                print(f"Skipping Canvas post for submission {submission.id}: no Canvas credentials available")
+            elif not submission.assignment_id or not submission.student_id:
+                print(f"Skipping Canvas post for submission {submission.id}: missing assignment_id or student_id")
+            else:
+                service = None
+                try:
+                    service = CanvasClientService(canvas_base_url, canvas_api_token)
+
+                    # Ensure we have a course id (either stored or provided via env)
+                    if not course_id:
+                        raise RuntimeError("Course ID not available on submission and CANVAS_COURSE_ID not set in environment")
+
+                    course = service.get_course(course_id)
+                    assignment = service.get_assignment(course, submission.assignment_id)
+                    final_points = scale_to_points(total_score, assignment)
+
+                    # Post the grade
+                    post_points(assignment, submission.student_id, final_points)
+                    print(f"Posted grade to Canvas for submission {submission.id}: {final_points}")
+                except Exception as e:
+                    if service is not None:
+                        service.invalidate(course_id, submission.assignment_id)
+                    print(f"Failed to post grade to Canvas for submission {submission.id if submission else 'unknown'}: {e}")
+    except Exception as e:
+        print(f"Unexpected error checking/submitting Canvas grade: {e}")
+
+
+def _schedule_canvas_post(background_tasks: BackgroundTasks, submission_id: Optional[int], total_score: float) -> None:
+    """Post the grade to Canvas after the response is sent so the client doesn't wait on Canvas."""
+    if submission_id:
+        background_tasks.add_task(_post_grade_to_canvas, submission_id, total_score)
 
 
-@app.post("/grade", response_model=Grading)
-def grade_essay(essay_id: int = Form(...), rubric_id: int = Form(...), payload: dict = Depends(auth)):
+@router.post("/grade", response_model=Grading)
+async def grade_essay(background_tasks: BackgroundTasks, essay_id: int = Form(...), rubric_id: int = Form(...),
+                      force_refresh: bool = Form(False), payload: dict = Depends(auth)):
     """
     Grade an essay based on a rubric.
 
     Returns grading results with scores, feedback, and text highlights.
+    Set force_refresh to ask Claude again instead of reusing a recent grade of the same pair.
     """
     user_email = payload.get("email")
-    with Session(engine) as session:
-        # Get essay and rubric
-        essay = session.get(Essay, essay_id)
-        if not essay:
-            raise HTTPException(status_code=404, detail="Essay not found")
-        if essay.created_by != user_email:
-            raise HTTPException(status_code=403, detail="Access denied to essay")
+    essay, rubric = await run_in_threadpool(_load_grading_inputs, essay_id, rubric_id, user_email)
+
+    # Grade the essay
+    try:
+        grader = get_grader()
+        # Rubric.criteria was parsed and stored at upload time
+        criteria = rubric.criteria or grader.parse_rubric(rubric.content)
+        grading_results = await grader.grade_essay_from_criteria_async(essay.content, criteria, force_refresh)
+        total_score = grader.calculate_total_score(grading_results)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error grading essay: {str(e)}"
+        )
 
-        rubric = session.get(Rubric, rubric_id)
-        if not rubric:
+    # Save grading to database
+    grading = Grading(
+        essay_id=essay_id,
+        rubric_id=rubric_id,
+        results=grading_results,
+        total_score=total_score,
+        created_by=user_email
+    )
+    grading = await run_in_threadpool(_save_row, grading)
+
+    _schedule_canvas_post(background_tasks, essay.submission_id, total_score)
+
+    return grading
+
+
+def _load_grading_inputs(essay_id: int, rubric_id: int, user_email: str) -> tuple[Essay, Rubric]:
+    with Session(read_engine) as session:
+        # Get essay and rubric in one round trip: an explicit cross join of the
+        # two primary-key lookups (the tables are unrelated, so no ON clause)
+        row = session.exec(
+            select(Essay, Rubric).join(Rubric, true())
+            .where(Essay.id == essay_id, Rubric.id == rubric_id)
+        ).first()
+        if row is None:
+            # Only hit when one of them is missing: work out which for the 404
+            if session.get(Essay, essay_id) is None:
+                raise HTTPException(status_code=404, detail="Essay not found")
             raise HTTPException(status_code=404, detail="Rubric not found")
+
+        essay, rubric = row
+        if essay.created_by != user_email:
+            raise HTTPException(status_code=403, detail="Access denied to essay")
         if rubric.created_by != user_email:
             raise HTTPException(status_code=403, detail="Access denied to rubric")
 
-        # Grade the essay
-        try:
-            grader = EssayGrader()
-            grading_results = grader.grade_essay(essay.content, rubric.content)
-            total_score = grader.calculate_total_score(grading_results)
-        except Exception as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Error grading essay: {str(e)}"
-            )
+        return essay, rubric
+
+
+def _save_row(row):
+    """Insert a new row and return it with its id; run via the threadpool from async routes."""
+    with Session(engine, expire_on_commit=False) as session:
+        session.add(row)
+        session.commit()
+        return row
 
-        # Save grading to database
-        grading = Grading(
-            essay_id=essay_id,
-            rubric_id=rubric_id,
-            results=grading_results,
-            total_score=total_score,
-            created_by=user_email
+
+class GradeBatchItem(BaseModel):
+    essay_id: int
+    rubric_id: int
+
+
+@router.post("/grade/batch", response_model=list[Grading])
+async def grade_essays_batch(background_tasks: BackgroundTasks,
+                             items: List[GradeBatchItem] = Body(..., max_length=MAX_GRADE_BATCH_ITEMS),
+                             force_refresh: bool = Query(False), payload: dict = Depends(auth)):
+    """
+    Grade several (essay, rubric) pairs in one request.
+
+    Claude calls run concurrently; the gradings are saved together and
+    returned in the order the items were given. ?force_refresh=true skips
+    recently cached grades for every item. At most MAX_GRADE_BATCH_ITEMS
+    items per request; larger batches get a 422.
+    """
+    user_email = payload.get("email")
+    pairs = await run_in_threadpool(_load_batch_inputs, items, user_email)
+
+    try:
+        grader = get_grader()
+        # Same criteria-based path as /grade: stored Rubric.criteria, no re-parsing
+        results = await grader.grade_many(
+            [(essay.content, rubric.criteria or grader.parse_rubric(rubric.content)) for essay, rubric in pairs],
+            force_refresh)
+        scores = [grader.calculate_total_score(grading_results) for grading_results in results]
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error grading essays: {str(e)}"
         )
-        session.add(grading)
+
+    gradings = await run_in_threadpool(_save_batch_gradings, pairs, results, scores, user_email)
+
+    for (essay, _), total_score in zip(pairs, scores):
+        _schedule_canvas_post(background_tasks, essay.submission_id, total_score)
+
+    return gradings
+
+
+def _load_batch_inputs(items: List[GradeBatchItem], user_email: str) -> list[tuple[Essay, Rubric]]:
+    """Fetch and authorize every essay/rubric up front so nothing is graded on a bad batch."""
+    with Session(read_engine) as session:
+        pairs = []
+        for item in items:
+            essay = session.get(Essay, item.essay_id)
+            if not essay:
+                raise HTTPException(status_code=404, detail=f"Essay {item.essay_id} not found")
+            if essay.created_by != user_email:
+                raise HTTPException(status_code=403, detail=f"Access denied to essay {item.essay_id}")
+
+            rubric = session.get(Rubric, item.rubric_id)
+            if not rubric:
+                raise HTTPException(status_code=404, detail=f"Rubric {item.rubric_id} not found")
+            if rubric.created_by != user_email:
+                raise HTTPException(status_code=403, detail=f"Access denied to rubric {item.rubric_id}")
+
+            pairs.append((essay, rubric))
+        return pairs
+
+
+def _save_batch_gradings(pairs: list[tuple[Essay, Rubric]], results: list[dict],
+                         scores: list[float], user_email: str) -> list[Grading]:
+    with Session(engine, expire_on_commit=False) as session:
+        gradings = [
+            Grading(
+                essay_id=essay.id,
+                rubric_id=rubric.id,
+                results=grading_results,
+                total_score=total_score,
+                created_by=user_email
+            )
+            for (essay, rubric), grading_results, total_score in zip(pairs, results, scores)
+        ]
+        session.add_all(gradings)
         session.commit()
-        session.refresh(grading)
-
-        # Attempt automatic post to Canvas if this essay came from an ingested Submission.
-        # Robust behavior:
-        # - Prefer credentials saved on the Submission.
-        # - Fall back to environment variables CANVAS_BASE_URL / CANVAS_API_TOKEN / CANVAS_COURSE_ID.
-        try:
-            submission = None
-            if getattr(essay, "submission_id", None):
-                submission = session.get(Submission, essay.submission_id)
-
-            if not submission:
-                # Nothing to do
-                pass
-            else:
-                # Determine Canvas connection info (prefer submission values)
-                canvas_base_url = getattr(submission, "canvas_base_url", None) or os.getenv("CANVAS_BASE_URL")
-                canvas_api_token = getattr(submission, "canvas_api_token", None) or os.getenv("CANVAS_API_TOKEN")
-                course_id = getattr(submission, "course_id", None) or (int(os.getenv("CANVAS_COURSE_ID")) if os.getenv("CANVAS_COURSE_ID") else None)
-
-                if not canvas_base_url or not canvas_api_token:
-                    print(f"Skipping Canvas post for submission {submission.id}: no Canvas credentials available")
-                elif not submission.assignment_id or not submission.student_id:
-                    print(f"Skipping Canvas post for submission {submission.id}: missing assignment_id or student_id")
-                else:
-                    try:
-                        service = CanvasClientService(canvas_base_url, canvas_api_token)
-
-                        # Ensure we have a course id (either stored or provided via env)
-                        if not course_id:
-                            raise RuntimeError("Course ID not available on submission and CANVAS_COURSE_ID not set in environment")
-
-                        course = service.get_course(course_id)
-                        assignment = service.get_assignment(course, submission.assignment_id)
-
-                        # Determine points possible and compute final points
-                        points_possible = getattr(assignment, "points_possible", None) or getattr(assignment, "points", None) or 10.0
-                        try:
-                            final_points = float(total_score) / 10.0 * float(points_possible)
-                        except Exception:
-                            final_points = float(total_score)
-
-                        # Post the grade
-                        canvas_submission = assignment.get_submission(submission.student_id)
-                        canvas_submission.edit(submission={'posted_grade': final_points})
-                        print(f"Posted grade to Canvas for submission {submission.id}: {final_points}")
-                    except Exception as e:
-                        print(f"Failed to post grade to Canvas for submission {submission.id if submission else 'unknown'}: {e}")
-        except Exception as e:
-            print(f"Unexpected error checking/submitting Canvas grade: {e}")
-
-        return grading
-
-
-@app.get("/gradings/", response_model=list[Grading])
-def list_gradings(payload: dict = Depends(auth)):
+
+        return gradings
+
+
+@router.get("/gradings/", response_model=list[Grading])
+def list_gradings(limit: int = Query(100, ge=1, le=1000), offset: int = Query(0, ge=0),
+                  payload: dict = Depends(auth), session: Session = Depends(get_read_session)):
     """List gradings performed by the authenticated user."""
     user_email = payload.get("email")
-    with Session(engine) as session:
-        gradings = session.exec(
-            select(Grading).where(Grading.created_by == user_email)
-        ).all()
-        return gradings
+    gradings = session.exec(
+        select(Grading).where(Grading.created_by == user_email)
+        .order_by(Grading.id).offset(offset).limit(limit)
+    ).all()
+    return gradings
 
 
-@app.get("/gradings/{grading_id}", response_model=Grading)
-def get_grading(grading_id: int, payload: dict = Depends(auth)):
+@router.get("/gradings/{grading_id}", response_model=Grading)
+def get_grading(grading_id: int, payload: dict = Depends(auth), session: Session = Depends(get_read_session)):
     """Get a specific grading by ID with all highlight information (must be graded by the authenticated user)."""
     user_email = payload.get("email")
-    with Session(engine) as session:
-        grading = session.get(Grading, grading_id)
-        if not grading:
-            raise HTTPException(status_code=404, detail="Grading not found")
-        if grading.created_by != user_email:
-            raise HTTPException(status_code=403, detail="Access denied")
-        return grading
-
-@app.post("/signup")
-def signup_route(user: SignUpSchema):
-    return signup(user)
-
-@app.post("/signin")
-def sign_in(request: SignInSchema):
-    return signin(request)
\ No newline at end of file
+    grading = session.get(Grading, grading_id)
+    if not grading:
+        raise HTTPException(status_code=404, detail="Grading not found")
+    if grading.created_by != user_email:
+        raise HTTPException(status_code=403, detail="Access denied")
+    return grading
+
+@router.post("/signup")
+async def signup_route(user: SignUpSchema):
+    return await signup(user)
+
+@router.post("/signin")
+async def sign_in(request: SignInSchema):
+    return await signin(request)
+
+
+def create_app() -> FastAPI:
+    """Build the application: middleware, routers and lifecycle hooks, each registered once."""
+    app = FastAPI(title="FastAPI + SQLite (SQLModel) example")
+
+    # Configure CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=[
+            "http://localhost:5173",  # Vite dev server
+            "http://localhost:5174",  # Vite alternative port
+            "http://localhost:3000",  # Alternative dev port
+            "http://127.0.0.1:5173",
+            "http://127.0.0.1:5174",
+            "http://127.0.0.1:3000",
+        ],
+        allow_credentials=True,
+        allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
+        allow_headers=["*"],
+        expose_headers=["*"],
+    )
+
+    app.include_router(canvas_router)
+    app.include_router(router)
+    app.add_event_handler("startup", init_db)
+    app.add_event_handler("shutdown", shutdown_executors)
+    return app
+
+
+app = create_app()
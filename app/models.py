@@ -74,6 +74,6 @@ class Submission(SQLModel, table=True):
 class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
-    email: str
+    email: str = Field(index=True, unique=True)
     hashed_password: str
     user_type: Optional[str]
@@ -7,17 +7,19 @@ from pathlib import Path
 import re
 import pymupdf
 
+_PARAGRAPH_BREAK_RE = re.compile(r'\n{2,}')
+_WHITESPACE_RE = re.compile(r'\s+')
 
-def pdf_to_text(pdf_path: str, output_path: str) -> str:
+
+def pdf_to_text_str(pdf_path: str) -> str:
     """
-    Extract text from PDF and save to text file.
+    Extract normalized text from a PDF and return it without writing a file.
     
     Args:
         pdf_path: Path to the PDF file
-        output_path: Path where the text file should be saved
         
     Returns:
-        Path to the saved text file
+        Extracted text, with paragraphs separated by blank lines
         
     Raises:
         FileNotFoundError: If PDF file doesn't exist
@@ -44,9 +46,27 @@ def pdf_to_text(pdf_path: str, output_path: str) -> str:
     
     # Normalize whitespace: collapse single newlines inside paragraphs into spaces,
     # but preserve paragraph breaks (two or more newlines).
-    paragraphs = re.split(r'\n{2,}', full_text)
-    cleaned_paragraphs = [re.sub(r'\s+', ' ', p).strip() for p in paragraphs if p.strip()]
-    normalized = "\n\n".join(cleaned_paragraphs)
+    paragraphs = _PARAGRAPH_BREAK_RE.split(full_text)
+    cleaned_paragraphs = [_WHITESPACE_RE.sub(' ', p).strip() for p in paragraphs if p.strip()]
+    return "\n\n".join(cleaned_paragraphs)
+
+
+def pdf_to_text(pdf_path: str, output_path: str) -> str:
+    """
+    Extract text from PDF and save to text file.
+    
+    Args:
+        pdf_path: Path to the PDF file
+        output_path: Path where the text file should be saved
+        
+    Returns:
+        Path to the saved text file
+        
+    Raises:
+        FileNotFoundError: If PDF file doesn't exist
+        Exception: If PDF cannot be processed
+    """
+    normalized = pdf_to_text_str(pdf_path)
     
     # Ensure output directory exists
     Path(output_path).parent.mkdir(parents=True, exist_ok=True)
@@ -55,4 +75,4 @@ def pdf_to_text(pdf_path: str, output_path: str) -> str:
     with open(output_path, 'w', encoding='utf-8') as f:
         f.write(normalized)
     
-    return output_path
\ No newline at end of file
+    return output_path
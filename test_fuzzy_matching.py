@@ -4,9 +4,42 @@ Test script to demonstrate fuzzy matching capabilities.
 This shows how the system handles LLM citations that aren't exact matches.
 """
 
+from concurrent.futures import ThreadPoolExecutor
+
+from rapidfuzz import fuzz, process
+
 from app.essay_grader import EssayGrader
 
 
+# (title, quoted text, essay text it should resolve to or None for no match,
+#  status label when found, status label when not found)
+CASES = [
+    ("EXACT MATCH",
+     "This essay demonstrates the importance of structured writing",
+     "This essay demonstrates the importance of structured writing",
+     "[OK] FOUND", "[X] NOT FOUND"),
+    ("WHITESPACE VARIATION",
+     "This essay  demonstrates   the importance",  # Extra spaces
+     "This essay demonstrates the importance",
+     "[OK] FOUND (normalized)", "[X] NOT FOUND"),
+    ("CASE VARIATION",  # Handled by fuzzy
+     "research shows that citations improve credibility",
+     "Research shows that citations improve credibility",
+     "[OK] FOUND (fuzzy)", "[X] NOT FOUND"),
+    ("SIMILAR TEXT (FUZZY)",  # Slight paraphrase, should still match
+     "research demonstrates citations improve credibility",
+     "Research shows that citations improve credibility",
+     "[OK] FOUND (fuzzy match)", "[X] NOT FOUND"),
+    ("CITATION",
+     "(Smith, 2019)",
+     "(Smith, 2019)",
+     "[OK] FOUND", "[X] NOT FOUND"),
+    ("NO MATCH (DIFFERENT TEXT)",
+     "This text does not exist in the essay at all",
+     None,
+     "[OK] FOUND", "[X] NOT FOUND (expected)"),
+]
+
 def test_fuzzy_matching():
     """Test the fuzzy matching functionality with various scenarios."""
 
@@ -19,63 +52,41 @@ def test_fuzzy_matching():
     Good essays also have clear structure with well-organized paragraphs.
     """
 
+    # The essay never changes between cases: lowercase and collapse its whitespace
+    # once, the way _locate_quotes does for a grading response
+    essay_lower = essay_text.lower()
+    normalized_essay = ' '.join(essay_text.split())
+
+    # Independent cross-check: overlapping windows, each long enough to hold any
+    # quote whole, sliced once and shared by every case
+    span = max(len(case[1]) for case in CASES)
+    windows = [essay_lower[i:i + 2 * span] for i in range(0, max(len(essay_lower) - span, 1), span)]
+
+    def locate(quoted):
+        return grader._find_text_position(essay_text, quoted, essay_lower=essay_lower,
+                                          normalized_essay=normalized_essay)
+
+    # The cases are independent, so match them concurrently and report in order
+    with ThreadPoolExecutor(max_workers=len(CASES)) as executor:
+        matches = list(executor.map(locate, [case[1] for case in CASES]))
+
     print("=" * 70)
     print("Fuzzy Matching Test Cases")
     print("=" * 70)
 
-    # Test Case 1: Exact match
-    print("\n1. EXACT MATCH")
-    quoted = "This essay demonstrates the importance of structured writing"
-    start, end, found = grader._find_text_position(essay_text, quoted)
-    print(f"   Quoted: '{quoted}'")
-    print(f"   Found:  '{found}'")
-    print(f"   Position: {start}-{end}")
-    print(f"   Status: {'[OK] FOUND' if start != -1 else '[X] NOT FOUND'}")
-
-    # Test Case 2: Extra whitespace
-    print("\n2. WHITESPACE VARIATION")
-    quoted = "This essay  demonstrates   the importance"  # Extra spaces
-    start, end, found = grader._find_text_position(essay_text, quoted)
-    print(f"   Quoted: '{quoted}'")
-    print(f"   Found:  '{found}'")
-    print(f"   Position: {start}-{end}")
-    print(f"   Status: {'[OK] FOUND (normalized)' if start != -1 else '[X] NOT FOUND'}")
-
-    # Test Case 3: Case variation (handled by fuzzy)
-    print("\n3. CASE VARIATION")
-    quoted = "research shows that citations improve credibility"
-    start, end, found = grader._find_text_position(essay_text, quoted)
-    print(f"   Quoted: '{quoted}'")
-    print(f"   Found:  '{found}'")
-    print(f"   Position: {start}-{end}")
-    print(f"   Status: {'[OK] FOUND (fuzzy)' if start != -1 else '[X] NOT FOUND'}")
-
-    # Test Case 4: Slight paraphrase (should still match with fuzzy)
-    print("\n4. SIMILAR TEXT (FUZZY)")
-    quoted = "research demonstrates citations improve credibility"
-    start, end, found = grader._find_text_position(essay_text, quoted)
-    print(f"   Quoted: '{quoted}'")
-    print(f"   Found:  '{found}'")
-    print(f"   Position: {start}-{end}")
-    print(f"   Status: {'[OK] FOUND (fuzzy match)' if start != -1 else '[X] NOT FOUND'}")
-
-    # Test Case 5: Citation format
-    print("\n5. CITATION")
-    quoted = "(Smith, 2019)"
-    start, end, found = grader._find_text_position(essay_text, quoted)
-    print(f"   Quoted: '{quoted}'")
-    print(f"   Found:  '{found}'")
-    print(f"   Position: {start}-{end}")
-    print(f"   Status: {'[OK] FOUND' if start != -1 else '[X] NOT FOUND'}")
-
-    # Test Case 6: Completely different text
-    print("\n6. NO MATCH (DIFFERENT TEXT)")
-    quoted = "This text does not exist in the essay at all"
-    start, end, found = grader._find_text_position(essay_text, quoted)
-    print(f"   Quoted: '{quoted}'")
-    print(f"   Found:  '{found}'")
-    print(f"   Position: {start}-{end}")
-    print(f"   Status: {'[OK] FOUND' if start != -1 else '[X] NOT FOUND (expected)'}")
+    for number, ((title, quoted, expected, found_label, missing_label), (start, end, found)) in enumerate(zip(CASES, matches), 1):
+        print(f"\n{number}. {title}")
+        print(f"   Quoted: '{quoted}'")
+        print(f"   Found:  '{found}'")
+        print(f"   Position: {start}-{end}")
+        print(f"   Status: {found_label if start != -1 else missing_label}")
+        if expected is None:
+            assert start == -1, f"case {number}: expected no match, got {start}-{end} '{found}'"
+        else:
+            assert start != -1, f"case {number}: expected a match for '{quoted}'"
+            assert essay_text[start:end] == found == expected, f"case {number}: matched '{found}', expected '{expected}'"
+        best = process.extractOne(quoted.lower(), windows, scorer=fuzz.partial_ratio, score_cutoff=75)
+        assert (start != -1) == (best is not None), f"grader and window scan disagree on case {number}"
 
     print("\n" + "=" * 70)
     print("Fuzzy Matching Test Complete!")
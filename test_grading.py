@@ -9,12 +9,31 @@ This script shows how to:
 """
 
 import requests
+import io
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from dotenv import load_dotenv
 
 BASE_URL = "http://localhost:8000"
 
+# One keep-alive session, so the ping, uploads and grade reuse a single connection
+_SESSION = requests.Session()
+
+# Sample inputs, read once; every upload wraps the bytes in a fresh BytesIO
+_ROOT = Path(__file__).resolve().parent
+ESSAY_PATH = _ROOT / "example_essays" / "essay.txt"
+RUBRIC_PATH = _ROOT / "example_rubrics" / "sample_rubric.txt"
+_ESSAY_BYTES = ESSAY_PATH.read_bytes()
+_RUBRIC_BYTES = RUBRIC_PATH.read_bytes()
+
+
+def _upload(endpoint, filename, data):
+    """POST in-memory file contents to /{endpoint}/."""
+    files = {'file': (filename, io.BytesIO(data), 'text/plain')}
+    return _SESSION.post(f"{BASE_URL}/{endpoint}/", files=files)
+
 
 def test_grading_pipeline():
     """Test the complete essay grading pipeline."""
@@ -23,13 +42,15 @@ def test_grading_pipeline():
     print("Essay Grading Pipeline Test")
     print("=" * 70)
 
+    # Steps 1 and 2 don't depend on each other, so both uploads go out at once
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        essay_future = executor.submit(_upload, "essays", ESSAY_PATH.name, _ESSAY_BYTES)
+        rubric_future = executor.submit(_upload, "rubrics", RUBRIC_PATH.name, _RUBRIC_BYTES)
+        essay_response, rubric_response = essay_future.result(), rubric_future.result()
+
     # Step 1: Upload essay
     print("\n1. Uploading essay...")
-    essay_path = "example_essays/essay.txt"
-
-    with open(essay_path, 'rb') as f:
-        files = {'file': (os.path.basename(essay_path), f, 'text/plain')}
-        response = requests.post(f"{BASE_URL}/essays/", files=files)
+    response = essay_response
 
     if response.status_code != 200:
         print(f"Error uploading essay: {response.text}")
@@ -43,11 +64,7 @@ def test_grading_pipeline():
 
     # Step 2: Upload rubric
     print("\n2. Uploading rubric...")
-    rubric_path = "example_rubrics/sample_rubric.txt"
-
-    with open(rubric_path, 'rb') as f:
-        files = {'file': (os.path.basename(rubric_path), f, 'text/plain')}
-        response = requests.post(f"{BASE_URL}/rubrics/", files=files)
+    response = rubric_response
 
     if response.status_code != 200:
         print(f"Error uploading rubric: {response.text}")
@@ -61,7 +78,7 @@ def test_grading_pipeline():
 
     # Step 3: Grade the essay
     print("\n3. Grading essay (this may take a moment)...")
-    response = requests.post(
+    response = _SESSION.post(
         f"{BASE_URL}/grade",
         data={'essay_id': essay_id, 'rubric_id': rubric_id}
     )
@@ -150,7 +167,7 @@ if __name__ == "__main__":
     # Check if server is running
     load_dotenv()
     try:
-        response = requests.get(f"{BASE_URL}/ping")
+        response = _SESSION.get(f"{BASE_URL}/ping")
         if response.status_code != 200:
             print("Error: Server is not responding properly")
             exit(1)
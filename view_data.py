@@ -1,9 +1,19 @@
 import requests
 import json
+import sys
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Get grading by ID
 response = requests.get('http://localhost:8000/gradings/2')
 grading = response.json()
 
-# Pretty print the results
-print(json.dumps(grading['results'], indent=2))
\ No newline at end of file
+# Pretty print the results: orjson's C encoder when installed, else stream the stdlib encoder's output
+if orjson is not None:
+    sys.stdout.buffer.write(orjson.dumps(grading['results'], option=orjson.OPT_INDENT_2) + b"\n")
+else:
+    json.dump(grading['results'], sys.stdout, indent=2)
+    print()